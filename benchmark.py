@@ -0,0 +1,149 @@
+"""Startup and rerun latency benchmark for the Streamlit app.
+
+Runs main.py headless through Streamlit's AppTest and reports median wall times for:
+
+- cold start: the first run of the input page in a fresh interpreter
+- input rerun: re-running the input page in a warm interpreter
+- output rerun: re-running the results page for a generated roster
+- placement: one Classroom.apply_for_admission in greedy and optimized mode for 60 active children
+  and a hold list of --hold entries, with every room at 4 to 24 seats. Optimized planning is
+  slowest when rooms are partly free, so full rooms alone understate it.
+
+Usage: python benchmark.py [--repeat N] [--children N] [--hold N]
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+COLD_START = """
+import time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file('main.py', default_timeout=120)
+start = time.perf_counter()
+at.run()
+assert not at.exception, at.exception
+print(time.perf_counter() - start)
+"""
+
+
+def make_roster(n, hold, seed):
+    import openpyxl
+
+    rng = random.Random(seed)
+    abbr = ['M', 'T', 'W', 'Th', 'F']
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for banner in ['Roster', '', '', '']:
+        ws.append([banner])
+    ws.append(['First Name', 'Last Name', 'Dob', 'Room', 'Time Schedule', 'Tags', 'Admission Date'])
+    for i in range(n):
+        days = sorted(rng.sample(range(5), rng.randint(1, 5)))
+        admission = today + timedelta(days=rng.randint(-20, 120) if hold else -rng.randint(1, 400))
+        ws.append([f'Child{i}', 'Hold' if hold else 'Active', today - timedelta(days=rng.randint(30, 5 * 365 - 10)),
+                   'Preschool', ', '.join(f'{abbr[d]} (am,pm)' for d in days),
+                   rng.choice(['FlexEd', 'Regular']), admission])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def make_fte():
+    import openpyxl
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['FTE'])
+    ws.append([''])
+    ws.append([''])
+    ws.append(['Room', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Total'])
+    for room in ['Infants', 'Wobblers', 'Older Toddlers', 'Preschool']:
+        ws.append([room, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def placement_time(active_bytes, hold_bytes, seats, admission_mode):
+    import pandas as pd
+
+    from engine import Classroom, Student
+    from pipeline import read_roster_file
+
+    active_df = read_roster_file(active_bytes)
+    hold_df = read_roster_file(hold_bytes)
+    active_df['Dob'] = pd.to_datetime(active_df['Dob'], errors='coerce')
+    hold_df['Dob'] = pd.to_datetime(hold_df['Dob'], errors='coerce')
+    hold_df['Admission Date'] = pd.to_datetime(hold_df['Admission Date'], errors='coerce')
+    classroom = Classroom([seats] * 4, admission_mode=admission_mode)
+    classroom.read_existing_data(active_df, hold_df)
+    applicant = Student('Bench', (datetime.now() - timedelta(days=200)).date(), ['Monday', 'Wednesday'], 'Fixed')
+    start = time.perf_counter()
+    classroom.apply_for_admission(applicant, datetime.now().date())
+    return time.perf_counter() - start
+
+
+def timed_runs(at, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - start)
+        assert not at.exception, at.exception
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--children', type=int, default=200)
+    parser.add_argument('--hold', type=int, default=300, help='hold list size for the placement timings')
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    sys.path.insert(0, HERE)
+    env = dict(os.environ, PYTHONPATH=HERE + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    cold = statistics.median(
+        float(subprocess.run([sys.executable, '-c', COLD_START], env=env, capture_output=True, text=True,
+                             check=True).stdout.split()[-1])
+        for _ in range(args.repeat))
+
+    from streamlit.testing.v1 import AppTest
+    from pipeline import check_availability
+
+    at = AppTest.from_file('main.py', default_timeout=120)
+    at.run()
+    input_rerun = timed_runs(at, args.repeat)
+
+    output = check_availability('Bench', datetime(2023, 1, 9).date(), ['Monday', 'Wednesday'], 'Fixed',
+                                datetime.now().date(), make_roster(args.children, False, 1),
+                                make_roster(args.children // 4, True, 2), make_fte())
+    at = AppTest.from_file('main.py', default_timeout=120)
+    at.session_state['page'] = 'output'
+    for key, value in output.items():
+        at.session_state[key] = value
+    at.run()
+    output_rerun = timed_runs(at, args.repeat)
+
+    active_bytes = make_roster(60, False, 1)
+    hold_bytes = make_roster(args.hold, True, 3)
+    placements = [(f"{mode} placement, {seats} seats", placement_time(active_bytes, hold_bytes, seats, mode))
+                  for seats in (4, 8, 12, 16, 24) for mode in ('greedy', 'optimized')]
+
+    print(f"{'cold start':<30}{cold * 1000:>10.1f} ms")
+    print(f"{'input rerun':<30}{input_rerun * 1000:>10.1f} ms")
+    print(f"{'output rerun':<30}{output_rerun * 1000:>10.1f} ms")
+    for label, seconds in placements:
+        print(f"{label:<30}{seconds * 1000:>10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from engine import classes
+from jobs import make_job_key
+from rooms import ROOMS
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+day_mapping = {'M': 'Monday', 'T': 'Tuesday', 'W': 'Wednesday', 'Th': 'Thursday', 'F': 'Friday', 'S': 'Saturday',
+               'Su': 'Sunday'}
+
+CUBE_DIR = os.path.join(tempfile.gettempdir(), 'mll_cubes')
+# Part of every cube's key: bump it when cube_schema or the simulation rules change, so cubes left
+# in CUBE_DIR by an older version are not reused
+CUBE_VERSION = 1
+# Cube directories neither written nor read for this long are deleted by write_cube
+CUBE_MAX_AGE = 2 * 24 * 3600
+NS_PER_DAY = 86400 * 10 ** 9
+
+cube_schema = pa.schema([
+    ('date', pa.date32()),
+    ('weekday', pa.int8()),
+    ('class', pa.dictionary(pa.int8(), pa.string())),
+    ('count', pa.int32()),
+    ('attending', pa.list_(pa.int32())),
+    ('graduating_out', pa.list_(pa.int32())),
+    ('graduating_in', pa.list_(pa.int32())),
+    ('admitted', pa.list_(pa.int32())),
+    ('fte', pa.float64()),
+])
+
+children_schema = pa.schema([
+    ('child_id', pa.int32()),
+    ('first_name', pa.string()),
+    ('last_name', pa.string()),
+])
+
+
+def _weekly_schedule(schedule):
+    # Same reading of 'M (am,pm), Th (am,pm)' as engine.is_scheduled_to_attend, for all seven days
+    mask = np.zeros(len(DAY_NAMES), dtype=bool)
+    if pd.isna(schedule):
+        return mask
+    for day in schedule.replace(' (am,pm)', '').split(','):
+        day_name = day_mapping.get(day.strip(), day)
+        if day_name in DAY_NAMES:
+            mask[DAY_NAMES.index(day_name)] = True
+    return mask
+
+
+def _class_index(day_ns, dob_ns, offset=0.0):
+    # Index into classes of each child on each day, len(classes) for none (unborn, graduated or no DoB)
+    ages = ((day_ns[:, None] - dob_ns[None, :]) // NS_PER_DAY) / 365.25 + offset
+    index = ROOMS.levels(ages) - 1
+    index[(index < 0) | np.isnat(dob_ns.view('datetime64[ns]'))[None, :]] = len(classes)
+    return index
+
+
+def simulate_occupancy_cube(start_date, active_df, hold_df, on_day=None, fte=None):
+    """Simulate three months of attendance as a typed occupancy cube.
+
+    Follows the same rules as engine.refined_simulate_three_months_with_graduation_and_schedule.
+    That simulator returns formatted strings, while this one returns counts and child IDs for
+    every date and class, computed with array operations over the whole range.
+
+    Returns (cube, children) Arrow tables. cube has one row per date and class, with the
+    attending, graduating and admitted children as child_id lists. children maps child_id to
+    names. IDs follow the order rows are visited in the reference simulator, so sorting by ID
+    reproduces its ordering. on_day and fte behave as in the reference simulator.
+    """
+    start_date = pd.to_datetime(start_date, format='%d-%m-%Y')
+    end_date = start_date + pd.DateOffset(months=3)
+    date_range = pd.date_range(start=start_date, end=end_date)
+    day_ns = date_range.values.astype(np.int64)
+    weekdays = date_range.weekday.values
+    class_names = list(classes)
+
+    active_dob = pd.to_datetime(active_df['Dob'], errors='coerce').values.astype('datetime64[ns]').view(np.int64)
+    hold_dob = pd.to_datetime(hold_df['Dob'], errors='coerce').values.astype('datetime64[ns]').view(np.int64)
+    admission = pd.to_datetime(hold_df['Admission Date'], errors='coerce').values.astype('datetime64[ns]')
+
+    # A hold child is admitted on the first day on or after their admission date when they are of
+    # daycare age, as long as the admission date is not before the simulation starts
+    hold_class = _class_index(day_ns, hold_dob)
+    eligible = ((admission.view(np.int64)[None, :] <= day_ns[:, None]) & (admission >= start_date.to_datetime64())
+                & (hold_class < len(classes)))
+    admitted_day = np.where(eligible.any(axis=0), eligible.argmax(axis=0), len(date_range))
+
+    # Children in the order the reference simulator visits them: active rows, then hold rows as admitted
+    hold_order = np.lexsort((np.arange(len(hold_df)), admitted_day))
+    dob_ns = np.concatenate([active_dob, hold_dob[hold_order]])
+    first_present = np.concatenate([np.zeros(len(active_df), dtype=np.int64), admitted_day[hold_order] + 1])
+    admitted_on = np.concatenate([np.full(len(active_df), -1), admitted_day[hold_order]])
+    weekly = np.array([_weekly_schedule(s) for s in active_df['Time Schedule']] +
+                      [_weekly_schedule(s) for s in hold_df['Time Schedule'].iloc[hold_order]],
+                      dtype=bool).reshape(-1, len(DAY_NAMES))
+
+    current = _class_index(day_ns, dob_ns)
+    upcoming = _class_index(day_ns, dob_ns, offset=1 / 365.25)
+    attending = ((np.arange(len(date_range))[:, None] >= first_present[None, :])
+                 & weekly[:, weekdays].T & (current < len(classes)))
+    graduating = attending & (upcoming != current) & (upcoming < len(classes))
+    admitted = np.arange(len(date_range))[:, None] == admitted_on[None, :]
+
+    rows = {name: [] for name in cube_schema.names}
+    for day in range(len(date_range)):
+        fte_by_class = fte.by_class_for_day(DAY_NAMES[weekdays[day]]) if fte is not None else None
+        capacities = {}
+        for index, class_name in enumerate(class_names):
+            in_class = attending[day] & (current[day] == index)
+            admitted_ids = np.flatnonzero(admitted[day] & (current[day] == index))
+            rows['date'].append(date_range[day].date())
+            rows['weekday'].append(weekdays[day])
+            rows['class'].append(class_name)
+            rows['count'].append(int(in_class.sum()) + len(admitted_ids))
+            rows['attending'].append(np.flatnonzero(in_class))
+            rows['graduating_out'].append(np.flatnonzero(graduating[day] & (current[day] == index)))
+            rows['graduating_in'].append(np.flatnonzero(graduating[day] & (upcoming[day] == index)))
+            rows['admitted'].append(admitted_ids)
+            rows['fte'].append(fte_by_class[class_name] if fte_by_class is not None else None)
+            capacities[class_name] = rows['count'][-1]
+        if on_day is not None:
+            on_day(day + 1, len(date_range), {'Date': date_range[day], 'Capacities': capacities})
+
+    cube = pa.Table.from_pydict(rows, schema=cube_schema)
+    names = pd.concat([active_df[['First Name', 'Last Name']],
+                       hold_df[['First Name', 'Last Name']].iloc[hold_order]], ignore_index=True)
+    children = pa.Table.from_pydict({
+        'child_id': np.arange(len(names), dtype=np.int32),
+        'first_name': [f"{name}" for name in names['First Name']],
+        'last_name': [f"{name}" for name in names['Last Name']],
+    }, schema=children_schema)
+    return cube, children
+
+
+def cube_key(roster_version, start_date):
+    """Key for the cube of a roster version and start date under the configured rooms and CUBE_VERSION.
+
+    CUBE_DIR outlives the server, so everything that shapes a cube is in the key: the uploads, the
+    start date, the room names and age bands from config.toml, and the cube format.
+    """
+    rooms = [(name, ROOMS.classes[name]) for name in ROOMS.names]
+    return make_job_key(roster_version, start_date, rooms, CUBE_VERSION)
+
+
+def prune_cubes(max_age=CUBE_MAX_AGE):
+    """Delete cube directories under CUBE_DIR that have not been written or read for max_age seconds.
+
+    A session that still has a deleted cube memory-mapped keeps its data until it unmaps it.
+    """
+    cutoff = time.time() - max_age
+    with os.scandir(CUBE_DIR) as entries:
+        for entry in entries:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def write_cube(key, cube, children):
+    """Write a cube and its children table to Parquet under CUBE_DIR/key and return the directory.
+
+    A key always holds the same cube, so an existing directory is reused. Another session may have
+    its files memory-mapped, so they are never rewritten in place: each file is written to a
+    temporary file in the same directory and renamed over, children first, so occupancy.parquet
+    only exists once both are complete.
+    """
+    directory = os.path.join(CUBE_DIR, key)
+    if os.path.exists(os.path.join(directory, 'occupancy.parquet')):
+        os.utime(directory)
+        return directory
+    os.makedirs(directory, exist_ok=True)
+    prune_cubes()
+    for file_name, table in (('children.parquet', children), ('occupancy.parquet', cube)):
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pq.write_table(table, f)
+            os.replace(temp_path, os.path.join(directory, file_name))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    return directory
+
+
+def content_hash(directory):
+    """Hash the Parquet files of a written cube, for keying caches of anything derived from it."""
+    digest = hashlib.sha256()
+    for file_name in ('occupancy.parquet', 'children.parquet'):
+        with open(os.path.join(directory, file_name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def read_cube(directory, class_name=None):
+    """Memory-map a cube written by write_cube, optionally keeping only one class."""
+    os.utime(directory)  # in use, so prune_cubes keeps it
+    cube = pq.read_table(os.path.join(directory, 'occupancy.parquet'), memory_map=True)
+    children = pq.read_table(os.path.join(directory, 'children.parquet'), memory_map=True)
+    if class_name is not None:
+        cube = cube.filter(pc.equal(cube['class'].cast(pa.string()), class_name))
+    return cube, children
+
+
+def describe_day(row, class_name, child_names):
+    """Format one cube row into the attendance, graduation and admission text shown in the UI.
+
+    child_names is a sequence of "First Last" strings indexed by child_id.
+    """
+    class_names = list(classes)
+    index = class_names.index(class_name)
+    attendance = ", ".join(child_names[i] for i in row['attending']) or "None"
+
+    graduation_sentences = []
+    for i in sorted(row['graduating_out'] + row['graduating_in']):
+        if i in row['graduating_out']:
+            graduation_sentences.append(f"{child_names[i]} graduated from {class_name} to {class_names[index + 1]}")
+        else:
+            graduation_sentences.append(f"{child_names[i]} graduated into {class_name} from {class_names[index - 1]}")
+    admission_sentences = [f"{child_names[i]} was admitted to {class_name}" for i in row['admitted']]
+
+    return (attendance,
+            " | ".join(graduation_sentences) if graduation_sentences else "None",
+            " | ".join(admission_sentences) if admission_sentences else "None")
+
+
+def child_names(children):
+    return [f"{first} {last}" for first, last in zip(children['first_name'].to_pylist(),
+                                                   children['last_name'].to_pylist())]
@@ -0,0 +1,294 @@
+"""Differential and fuzz harness for the availability engines.
+
+Generates random rosters, capacities and applicants, and checks the engines the app runs against
+the frozen copies in reference.py:
+
+- earliest date: engine.Classroom.apply_for_admission, in greedy and optimized admission modes
+- queue order: in optimized mode, no hold child due by the applicant's date, and with a free seat
+  on that date, is left waiting while the applicant takes it
+- forecast: forecast.forecast_admission with every perturbation rate at 0, which must put all
+  runs on the greedy engine's earliest date (or find no seat when the engine finds none)
+- daily capacities: cube.simulate_occupancy_cube read through a timeline.Timeline, against the
+  reference simulator's capacities, attendance, graduations and admissions for every day, and
+  Timeline.first_date_below_capacity against a scan of the reference days
+
+Rosters lean on the cases the engines are most likely to get wrong: birthdays that cross a class
+boundary during the simulated months, children graduating out at five, missing dates of birth and
+admission dates, hold children admitted before the start or after the end, Saturday sessions and
+small, often full, classes.
+
+Each case is generated from seed + its index, so a mismatch is reproduced with
+--seed <reported seed> --cases 1. Speedups are the median over cases of reference time divided by
+engine time; for the forecast, of one greedy reference placement divided by one forecast run. The
+queue order check has no reference and no speedup. Exits with status 1 if any engine disagrees with
+its reference or a hold child is passed over.
+
+Usage: python differential.py [--cases N] [--seed N] [--children N]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+ABBREVIATIONS = ['M', 'T', 'W', 'Th', 'F']
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+ROOMS = ['Infants', 'Wobblers', 'Older Toddlers', 'Preschool']
+COLUMNS = ['First Name', 'Last Name', 'Dob', 'Room', 'Time Schedule', 'Tags', 'Admission Date']
+
+
+def random_dob(rng, today, max_days=5 * 365):
+    # Everyone is of daycare age today, as Classroom requires, and one in five children has a
+    # class boundary birthday within the simulated months
+    if rng.random() < 0.2:
+        years = rng.choice([1, 2, 3, 5])
+        return today + timedelta(days=rng.randint(1 if years == 5 else -5, 95)) - relativedelta(years=years)
+    return today - timedelta(days=rng.randint(0, max_days))
+
+
+def random_schedule(rng):
+    days = sorted(rng.sample(range(5), rng.randint(1, 5)))
+    sessions = [f'{ABBREVIATIONS[day]} (am,pm)' for day in days]
+    if rng.random() < 0.05:
+        sessions.append('S (am,pm)')
+    return ', '.join(sessions)
+
+
+def make_roster(rng, n, hold, today):
+    rows = []
+    for i in range(n):
+        dob = random_dob(rng, today)
+        if hold:
+            admission = today + timedelta(days=rng.randint(-30, 150))
+            if rng.random() < 0.05:
+                dob = pd.NaT
+            if rng.random() < 0.05:
+                admission = pd.NaT
+        else:
+            admission = today - timedelta(days=rng.randint(1, 400))
+            if rng.random() < 0.03:
+                dob = pd.NaT
+        rows.append([f'Child{i}', 'Hold' if hold else 'Active', dob, rng.choice(ROOMS), random_schedule(rng),
+                     rng.choice(['FlexEd', 'Regular', 'FlexEd, Sibling']), admission])
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    # The same conversions pipeline.check_availability applies after reading the uploads
+    df['Dob'] = pd.to_datetime(df['Dob'], errors='coerce')
+    if hold:
+        df['Admission Date'] = pd.to_datetime(df['Admission Date'], errors='coerce')
+    return df
+
+
+def make_case(seed, max_children):
+    rng = random.Random(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        'seed': seed,
+        'active_df': make_roster(rng, rng.randint(0, max_children), False, today),
+        'hold_df': make_roster(rng, rng.randint(0, max_children // 2), True, today),
+        'capacity_levels': [rng.choice([1, 2, 4, 8, 20]) for _ in ROOMS],
+        'applicant_dob': random_dob(rng, today, max_days=4 * 365 + 300).date(),
+        'schedule': [WEEKDAYS[day] for day in sorted(rng.sample(range(5), rng.randint(1, 5)))],
+        'program_type': rng.choice(['Fixed', 'Flexible']),
+        'joining_date': (today + timedelta(days=rng.randint(-10, 120))).date(),
+    }
+
+
+def earliest_date(engine, case, admission_mode):
+    classroom = engine.Classroom(list(case['capacity_levels']), admission_mode=admission_mode)
+    classroom.read_existing_data(case['active_df'].copy(), case['hold_df'].copy())
+    applicant = engine.Student('Applicant', case['applicant_dob'], case['schedule'], case['program_type'])
+    if applicant.level is None:
+        return None
+    date, schedule, flexible = classroom.apply_for_admission(applicant, case['joining_date'])
+    # Flexible placements are dated from datetime.now(), so only the day is compared
+    return (date.date() if date else date), schedule, flexible
+
+
+def queue_jumps(engine, case, admission_mode):
+    """Hold children queued ahead of the applicant who lost their seat to them.
+
+    A hold child is ahead of the applicant if their start date is on or before the applicant's
+    date and they are still young enough for the level then. They were passed over if they are
+    still waiting, could have joined on that date, and the applicant no longer fits once they do.
+    """
+    classroom = engine.Classroom(list(case['capacity_levels']), admission_mode=admission_mode)
+    classroom.read_existing_data(case['active_df'].copy(), case['hold_df'].copy())
+    applicant = engine.Student('Applicant', case['applicant_dob'], case['schedule'], case['program_type'])
+    if applicant.level is None:
+        return []
+    date, schedule, flexible = classroom.apply_for_admission(applicant, case['joining_date'])
+    if not date or flexible:
+        return []
+    level = applicant.level
+    jumped = []
+    for student in classroom.level_queues[level]:
+        if student.start_date > date or date >= classroom.calculate_promotion_date(student):
+            continue
+        if not classroom.can_join_level(student.schedule, level):
+            continue
+        classroom.students.append(student)
+        if not classroom.can_join_level(schedule, level):
+            jumped.append(student.name)
+        classroom.students.remove(student)
+    return jumped
+
+
+def zero_noise_forecast(case, runs):
+    from forecast import forecast_admission
+
+    forecast = forecast_admission(case['active_df'].copy(), case['hold_df'].copy(), case['applicant_dob'],
+                                  case['schedule'], case['joining_date'], case['capacity_levels'], runs=runs,
+                                  dropout_rate=0.0, slip_rate=0.0, flex_change_rate=0.0, workers=1, seed=case['seed'])
+    if forecast['no_slot_probability'] == 1.0:
+        return None
+    return forecast['distribution'].index[0].date(), float(forecast['distribution']['Probability'].iloc[0])
+
+
+def expected_forecast(engine_result, case, horizon_days=365):
+    # The engine's date as the forecast reports it: every run on it, or no seat within the horizon
+    if engine_result is None or engine_result[0] is False:
+        return None
+    if (engine_result[0] - case['joining_date']).days > horizon_days:
+        return None
+    return engine_result[0], 1.0
+
+
+def reference_days(case, start_date):
+    from reference import classes, refined_simulate_three_months_with_graduation_and_schedule
+
+    days = []
+    for result in refined_simulate_three_months_with_graduation_and_schedule(
+            start_date, case['active_df'].copy(), case['hold_df'].copy()):
+        days.append((result['Date'].date(),
+                     tuple(result['Capacities'][class_name] for class_name in classes),
+                     tuple(result['Attendance'][class_name] for class_name in classes),
+                     [tuple(graduation) for graduation in result['Graduations']],
+                     [tuple(admission) for admission in result['Admissions']]))
+    return days
+
+
+def timeline_days(case, start_date):
+    from cube import simulate_occupancy_cube
+    from timeline import Timeline
+
+    cube, children = simulate_occupancy_cube(start_date, case['active_df'].copy(), case['hold_df'].copy())
+    timeline = Timeline(cube, children, case['capacity_levels'])
+    first_names = children['first_name'].to_pylist()
+    last_names = children['last_name'].to_pylist()
+    class_names = timeline.class_names
+
+    days = []
+    for date in timeline.dates:
+        rows = [timeline.day(class_name, date) for class_name in class_names]
+        graduations = sorted((i, first_names[i], last_names[i], class_names[index], class_names[index + 1])
+                             for index, row in enumerate(rows) for i in row['graduating_out'])
+        admissions = sorted((i, first_names[i], last_names[i], class_names[index])
+                            for index, row in enumerate(rows) for i in row['admitted'])
+        days.append((date.astype(object),
+                     tuple(row['count'] for row in rows),
+                     tuple(", ".join(timeline.names[i] for i in row['attending']) or "None" for row in rows),
+                     [graduation[1:] for graduation in graduations],
+                     [admission[1:] for admission in admissions]))
+    return days, timeline
+
+
+def first_open_day(days, class_index, capacity, weekdays, start):
+    wanted = [WEEKDAYS.index(day) for day in weekdays]
+    return next((date for date, counts, *_ in days
+                 if date >= start and date.weekday() in wanted and counts[class_index] < capacity), None)
+
+
+def first_difference(expected, actual):
+    if len(expected) != len(actual):
+        return f'{len(expected)} days in the reference, {len(actual)} in the engine'
+    for reference_day, engine_day in zip(expected, actual):
+        if reference_day != engine_day:
+            return f'reference {reference_day!r}\n        engine    {engine_day!r}'
+    return None
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cases', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--children', type=int, default=60, help='largest active roster; hold rosters are half')
+    args = parser.parse_args()
+
+    sys.path.insert(0, HERE)
+    warnings.simplefilter('ignore')
+    import engine
+    import reference
+
+    checks = ['earliest date (greedy)', 'earliest date (optimized)', 'queue order (optimized)', 'forecast (zero noise)',
+              'daily capacities', 'first open day']
+    forecast_runs = 5
+    mismatches = {check: 0 for check in checks}
+    speedups = {check: [] for check in checks}
+    start_date = datetime.now().strftime('%d-%m-%Y')
+
+    def report(check, case, detail):
+        mismatches[check] += 1
+        print(f"MISMATCH {check}, seed {case['seed']}:\n        {detail}")
+
+    for i in range(args.cases):
+        case = make_case(args.seed + i, args.children)
+
+        for mode in ['greedy', 'optimized']:
+            check = f'earliest date ({mode})'
+            expected, reference_time = timed(earliest_date, reference, case, mode)
+            actual, engine_time = timed(earliest_date, engine, case, mode)
+            speedups[check].append(reference_time / engine_time)
+            if expected != actual:
+                report(check, case, f'reference {expected!r}, engine {actual!r}')
+            if mode == 'greedy':
+                greedy, greedy_reference_time = actual, reference_time
+
+        jumped = queue_jumps(engine, case, 'optimized')
+        if jumped:
+            report('queue order (optimized)', case, f"applicant placed ahead of {', '.join(jumped)}")
+
+        found, forecast_time = timed(zero_noise_forecast, case, forecast_runs)
+        speedups['forecast (zero noise)'].append(greedy_reference_time / (forecast_time / forecast_runs))
+        if found != expected_forecast(greedy, case):
+            report('forecast (zero noise)', case, f'engine {greedy!r}, forecast {found!r}')
+
+        expected, reference_time = timed(reference_days, case, start_date)
+        (actual, timeline), engine_time = timed(timeline_days, case, start_date)
+        speedups['daily capacities'].append(reference_time / engine_time)
+        difference = first_difference(expected, actual)
+        if difference:
+            report('daily capacities', case, difference)
+
+        class_index = random.Random(case['seed']).randrange(len(timeline.class_names))
+        start = expected[0][0] + timedelta(days=random.Random(case['seed']).randint(0, 60))
+        capacity = case['capacity_levels'][class_index]
+        wanted, reference_time = timed(first_open_day, expected, class_index, capacity, case['schedule'], start)
+        found, engine_time = timed(timeline.first_date_below_capacity, timeline.class_names[class_index],
+                                   case['schedule'], start)
+        speedups['first open day'].append(reference_time / engine_time)
+        if wanted != found:
+            report('first open day', case, f'reference {wanted!r}, engine {found!r}')
+
+    print(f"{'check':<28}{'cases':>7}{'mismatches':>12}{'speedup':>10}")
+    for check in checks:
+        speedup = f"{statistics.median(speedups[check]):>9.1f}x" if speedups[check] else f"{'-':>10}"
+        print(f"{check:<28}{args.cases:>7}{mismatches[check]:>12}{speedup}")
+    return 1 if any(mismatches.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,429 @@
+import pandas as pd
+from datetime import datetime, timedelta
+from collections import deque
+
+from rooms import ROOMS, age_offset
+
+# The classes and their age ranges, from the room model in config.toml
+classes = ROOMS.classes
+
+class Student:
+    def __init__(self, name, date_of_birth, schedule, program_type, start_date=None):
+        self.name = name
+        self.date_of_birth = datetime.combine(date_of_birth, datetime.min.time())  # Convert date to datetime
+        self.level = self.calculate_level_by_dob()
+        self.schedule = schedule
+        self.program_type = program_type
+        self.start_date = start_date
+        self.existing_student = False
+        self.promotion_date = None
+
+    def calculate_level_by_dob(self):
+        age = (datetime.now() - self.date_of_birth).days / 365.25
+        return ROOMS.level_for_age(age)  # None if age does not fall into any range
+
+    def get_class_name(self):
+        age = (datetime.now() - self.date_of_birth).days / 365.25
+        return ROOMS.class_for_age(age)  # "Graduated" once the child is past every room
+
+    def __str__(self):
+        date_of_birth_str = self.date_of_birth.strftime('%Y-%m-%d')
+        return (f"Student(Name: {self.name}, Date of Birth: {date_of_birth_str}, Level: {self.level}, "
+                f"Schedule: {self.schedule}, Program Type: {self.program_type}, Start Date: {self.start_date}, "
+                f"Class: {self.get_class_name()})")
+
+class Classroom:
+    def __init__(self, capacity_levels, admission_mode='greedy', plan_options=None):
+        # admission_mode 'greedy' admits hold-list children in start date order as seats open,
+        # 'optimized' follows the seat-filling plan from scheduler.plan_admissions, called with
+        # any keyword arguments in plan_options
+        self.capacity_levels = capacity_levels
+        self.admission_mode = admission_mode
+        self.plan_options = plan_options or {}
+        self.admission_plans = {}
+        self.levels = range(1, len(capacity_levels) + 1)
+        self.level_queues = {level: deque() for level in self.levels}
+        self.level_promotedQueues = {level: deque() for level in self.levels}
+        self.level_promotedQueues2 = {level: deque() for level in self.levels}
+        self.students = []
+        self.graduated_students = []
+
+    def read_existing_data(self, active_df, hold_df):
+        active_df = active_df[['First Name', 'Dob', 'Room', 'Time Schedule', 'Tags', 'Admission Date']]
+        active_df = active_df.rename(
+            columns={'First Name': 'Name', 'Dob': 'DoB', 'Room': 'Room', 'Time Schedule': 'Schedule',
+                     'Tags': 'Program Type', 'Admission Date': 'Start Date'})
+        active_df['Program Type'] = active_df['Program Type'].str.contains('FlexEd').map(
+            {True: 'Flexible', False: 'Fixed'})
+
+        hold_df = hold_df[['First Name', 'Dob', 'Room', 'Time Schedule', 'Tags', 'Admission Date']]
+        hold_df = hold_df.rename(
+            columns={'First Name': 'Name', 'Dob': 'DoB', 'Room': 'Room', 'Time Schedule': 'Schedule',
+                     'Tags': 'Program Type', 'Admission Date': 'Admission Date'})
+        hold_df['Program Type'] = hold_df['Program Type'].str.contains('FlexEd').map({True: 'Flexible', False: 'Fixed'})
+
+        def convert_days(schedule):
+            day_mapping = {
+                'M': 'Monday',
+                'T': 'Tuesday',
+                'W': 'Wednesday',
+                'Th': 'Thursday',
+                'F': 'Friday'}
+
+            days = schedule.split(', ')
+            full_day_names = []
+
+            for day in days:
+                day_abbr = day.split(' ')[0]
+                if day_abbr in day_mapping:
+                    full_day_names.append(day_mapping[day_abbr])
+
+            return ','.join(full_day_names)
+
+        active_df['Schedule'] = active_df['Schedule'].apply(convert_days)
+        active_df['Schedule'] = active_df['Schedule'].apply(lambda x: x.split(','))
+        hold_df['Schedule'] = hold_df['Schedule'].apply(convert_days)
+        hold_df['Schedule'] = hold_df['Schedule'].apply(lambda x: x.split(','))
+
+        for _, row in active_df.iterrows():
+            if pd.notna(row['DoB']):
+                student = Student(row['Name'], datetime.strptime(str(row['DoB']), '%Y-%m-%d %H:%M:%S'),
+                                  row['Schedule'], row['Program Type'],
+                                  datetime.strptime(str(row['Start Date']), '%Y-%m-%d %H:%M:%S'))
+                student.promotion_date = self.calculate_promotion_date(student)
+                student.existing_student = True
+                self.students.append(student)
+
+        for _, row in hold_df.iterrows():
+            if pd.notna(row['DoB']) and pd.notna(row['Admission Date']):
+                student = Student(row['Name'], datetime.strptime(str(row['DoB']), '%Y-%m-%d %H:%M:%S'),
+                                  row['Schedule'], row['Program Type'],
+                                  datetime.strptime(str(row['Admission Date']), '%Y-%m-%d %H:%M:%S'))
+                student.promotion_date = self.calculate_promotion_date(student)
+                self.level_queues[student.level].append(student)
+
+    def calculate_daily_strength(self):
+        daily_strength = {day: {level: 0 for level in self.levels}
+                          for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]}
+
+        for student in self.students:
+            if student.existing_student and student.schedule is not None:
+                for day in student.schedule:
+                    for level in self.levels:
+                        if student.level == level:
+                            daily_strength[day.strip()][level] += 1
+
+        df = pd.DataFrame(daily_strength)
+        return df
+
+    def level_attended_every_day(self, level):
+        # Same as (calculate_daily_strength().loc[level] != 0).all(), without building a DataFrame
+        # for every admission, which dominated the forecast's per-run cost
+        attended = dict.fromkeys(["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"], False)
+        for student in self.students:
+            if student.existing_student and student.schedule is not None and student.level == level:
+                for day in student.schedule:
+                    attended[day.strip()] = True
+        return all(attended.values())
+
+    def kpi_calculate(self, level):
+        total_active_students = [0] * len(self.levels)
+        total_hold_students = [0] * len(self.levels)
+        graduating_soon = [0] * len(self.levels)
+        admitted_recent = [0] * len(self.levels)
+        i = 0
+        j = 0
+        k = 0
+        for student in self.students:
+            if student.level == level:
+                i += 1
+                total_active_students[level - 1] = i
+                if student.promotion_date <= (datetime.now() + timedelta(60)):
+                    j += 1
+                    graduating_soon[level - 1] = j
+                if student.promotion_date >= (datetime.now() + timedelta(300)):
+                    j += 1
+                    graduating_soon[level - 1] = j
+                if student.start_date >= (datetime.now() - timedelta(60)):
+                    k += 1
+                    admitted_recent[level - 1] = k
+        total_hold_students[level - 1] = len(self.level_queues[level])
+
+        return total_active_students, total_hold_students, graduating_soon, admitted_recent
+
+    def apply_for_admission(self, applicant, preferred_joining_date=None):
+        slot_found = False
+        schedule = applicant.schedule
+        if preferred_joining_date is None:
+            preferred_joining_date = datetime.now()
+
+        preferred_joining_date = datetime.combine(preferred_joining_date, datetime.min.time())  # Ensure datetime type
+        self.update_members(preferred_joining_date, None)
+        level = applicant.level
+        self.admit_hold_ahead_of_applicant(level, preferred_joining_date)
+        flexible_students = [student for student in self.students if
+                             student.existing_student and student.level == level and student.program_type == "Flexible"]
+
+        if self.can_join_level(schedule, level):
+            slot_found = True
+            return preferred_joining_date, schedule, False
+        elif flexible_students:
+            slot_found = True
+            return (datetime.now() + timedelta(32)), schedule, True
+        else:
+            next_dates_list = self.calculate_next_possible_dates(level, preferred_joining_date)
+            next_dates_list_sorted = sorted(next_dates_list)
+            prev_date = None
+            # A seat only counts while the applicant is still in the level, up to the date the room
+            # model would promote them out of it
+            leaves_level = applicant.date_of_birth + age_offset(ROOMS.age_limit(applicant.level))
+            for next_date in next_dates_list_sorted:
+                if next_date >= leaves_level:
+                    break
+                self.update_members(next_date, None)
+                self.admit_hold_ahead_of_applicant(level, next_date)
+                if self.can_join_level(schedule, level):
+                    slot_found = True
+                    break
+                prev_date = next_date
+            if slot_found:
+                return next_date, schedule, False
+            else:
+                return False, False, False
+
+    def update_members(self, preferred_joining_date, level):
+        if level is None:
+            for level in self.levels:
+                self.promote_students(level, preferred_joining_date)
+                self.update_waiting_list(level)
+                self.admit_students_from_waiting(level, preferred_joining_date)
+        else:
+            self.promote_students(level, preferred_joining_date)
+            self.update_waiting_list(level)
+            self.admit_students_from_waiting(level, preferred_joining_date)
+
+    def promote_students(self, level, preferred_joining_date):
+        for student in self.students:
+            if student.existing_student and student.level == level and preferred_joining_date >= student.promotion_date:
+                next_level = student.level + 1
+                schedule = student.schedule
+                if next_level < len(self.levels) and self.can_join_level(schedule, next_level):
+                    student.level = next_level
+                    student.promotion_date = self.calculate_promotion_date(student, student.promotion_date)
+                elif next_level < len(self.levels):
+                    student.level = next_level
+                    student.start_date = student.promotion_date
+                    student.promotion_date = self.calculate_promotion_date(student, student.promotion_date)
+                    self.level_promotedQueues[student.level].append(student)
+                    self.students.remove(student)
+                elif student.level == len(self.levels) and preferred_joining_date >= student.promotion_date:
+                    self.students.remove(student)
+                    self.graduated_students.append(student)
+
+    def update_waiting_list(self, level):
+        if len(self.level_promotedQueues[level]) > 0:
+            self.level_promotedQueues[level] = sorted(self.level_promotedQueues[level], key=lambda x: x.start_date)
+            self.level_promotedQueues[level] = deque(self.level_promotedQueues[level])
+        if len(self.level_queues[level]) > 0:
+            self.level_queues[level] = sorted(self.level_queues[level], key=lambda x: x.start_date)
+            self.level_queues[level] = deque(self.level_queues[level])
+
+    def admit_students_from_waiting(self, level, preferred_joining_date):
+        if self.admission_mode == 'optimized':
+            self.admit_students_by_plan(level, preferred_joining_date)
+            return
+        while self.level_attended_every_day(level):
+            if len(self.level_promotedQueues[level]) > 0:
+                student = self.level_promotedQueues[level].popleft()
+                schedule = student.schedule
+                if self.can_join_level(schedule, level):
+                    self.students.append(student)
+                else:
+                    self.level_promotedQueues2[level].append(student)
+            elif len(self.level_queues[level]) > 0:
+                student = self.level_queues[level].popleft()
+                schedule = student.schedule
+                if student.start_date <= preferred_joining_date and self.can_join_level(schedule, level):
+                    student.existing_student = True
+                    student.promotion_date = self.calculate_promotion_date(student, student.start_date)
+                    self.students.append(student)
+                else:
+                    self.level_promotedQueues2[level].append(student)
+            else:
+                break
+        self.level_promotedQueues[level].extend(self.level_promotedQueues2[level])
+
+    def admit_students_by_plan(self, level, preferred_joining_date):
+        from scheduler import plan_admissions
+
+        # Promoted students still take the first free seats
+        waiting_promoted = deque()
+        while len(self.level_promotedQueues[level]) > 0:
+            student = self.level_promotedQueues[level].popleft()
+            if self.can_join_level(student.schedule, level):
+                self.students.append(student)
+            else:
+                waiting_promoted.append(student)
+        self.level_promotedQueues[level] = waiting_promoted
+
+        # The plan is made once per level, the first time the level is filled
+        if level not in self.admission_plans:
+            self.admission_plans[level] = plan_admissions(self, level, preferred_joining_date, **self.plan_options)
+        plan = self.admission_plans[level]
+
+        waiting_hold = deque()
+        for student in sorted(self.level_queues[level], key=lambda x: plan.get(x, x.start_date)):
+            planned_date = plan.get(student)
+            if planned_date is not None and planned_date <= preferred_joining_date and self.can_join_level(
+                    student.schedule, level):
+                student.existing_student = True
+                student.promotion_date = self.calculate_promotion_date(student, planned_date)
+                self.students.append(student)
+            else:
+                waiting_hold.append(student)
+        self.level_queues[level] = waiting_hold
+
+    def admit_hold_ahead_of_applicant(self, level, date):
+        # The optimized plan may hold a child back for a later week, but the applicant joins the back
+        # of the queue: a hold child due by date, still young enough for the level and with a free
+        # seat takes it before the applicant is considered. Greedy mode has already admitted them.
+        if self.admission_mode != 'optimized':
+            return
+        for student in list(self.level_queues[level]):
+            if student.start_date <= date < self.calculate_promotion_date(student) and self.can_join_level(
+                    student.schedule, level):
+                student.existing_student = True
+                student.promotion_date = self.calculate_promotion_date(student, date)
+                self.students.append(student)
+                self.level_queues[level].remove(student)
+
+    def can_join_level(self, schedule, level):
+        level_capacity = self.capacity_levels[level - 1]
+        for day in schedule:
+            students_in_level = sum(1 for student in self.students if
+                                    student.level == level and student.schedule and day.lower() in [d.lower() for d in
+                                                                                                    student.schedule])
+            if students_in_level >= level_capacity:
+                return False
+        return True
+
+    def calculate_level(self, dob):
+        # Same bands and age reckoning as Student.calculate_level_by_dob
+        return ROOMS.level_for_age((datetime.now() - dob).days / 365.25)
+
+    def calculate_next_possible_dates(self, level, preferred_joining_date):
+        nextPromotedDates = []
+        if level > 2:
+            nextPromotedDates.extend(student.promotion_date for student in self.students if
+                                     student.level == level - 2 and student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+            nextPromotedDates.extend(student.promotion_date for student in self.level_queues[level - 2] if
+                                     student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+        if level > 1:
+            nextPromotedDates.extend(student.promotion_date for student in self.students if
+                                     student.level == level - 1 and student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+            nextPromotedDates.extend(student.promotion_date for student in self.level_queues[level - 1] if
+                                     student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+
+        nextPromotedDates.extend(student.promotion_date for student in self.students if
+                                 student.level == level and student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+        nextPromotedDates.extend(student.promotion_date for student in self.level_queues[level] if
+                                 student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+        return nextPromotedDates
+
+    def calculate_promotion_date(self, student, inputDate=datetime.now(), promotion_date=None):
+        if promotion_date is None:
+            current_level_age_limit = self.get_age_limit(student.level)
+            promotion_date = student.date_of_birth + age_offset(current_level_age_limit)
+        return promotion_date
+
+    def get_age_limit(self, level):
+        return ROOMS.age_limit(level)
+
+    def printStudent(self, level):
+        for student in self.students:
+            if student.level == level:
+                print(student.name)
+                print(str(student.date_of_birth))
+                print(student.existing_student)
+                print(str(student.promotion_date))
+                print("-------------------******************-------------------")
+
+
+def get_correct_class_by_age(age):
+    # 'Graduated' for ages outside every room, including before birth
+    return ROOMS.class_for_age(age)
+
+
+def is_scheduled_to_attend(schedule, current_date):
+    if pd.isna(schedule):
+        return False
+    day_mapping = {
+        'M': 'Monday',
+        'T': 'Tuesday',
+        'W': 'Wednesday',
+        'Th': 'Thursday',
+        'F': 'Friday',
+        'S': 'Saturday',
+        'Su': 'Sunday'
+    }
+    schedule_days = [day_mapping.get(day.strip(), day) for day in schedule.replace(' (am,pm)', '').split(',')]
+    day_of_week = current_date.strftime('%A')
+    return day_of_week in schedule_days
+
+
+def refined_simulate_three_months_with_graduation_and_schedule(start_date, active_df, hold_df, on_day=None,
+                                                              fte=None):
+    # on_day, if given, is called after each simulated day with (days_done, total_days, day_result)
+    # fte, if given, is an fte.FteSummary whose per-room weekday FTE is attached to each day
+    results = []
+    start_date = pd.to_datetime(start_date, format='%d-%m-%Y')
+    end_date = start_date + pd.DateOffset(months=3)
+    date_range = pd.date_range(start=start_date, end=end_date)
+
+    for current_date in date_range:
+        daily_capacities = {class_name: 0 for class_name in classes.keys()}
+        graduations = []
+        admissions = []
+        attendance_log = {class_name: [] for class_name in classes.keys()}
+
+        # Ensure Dob column is datetime
+        active_df['Dob'] = pd.to_datetime(active_df['Dob'], errors='coerce')
+
+        active_df['Age'] = (current_date - active_df['Dob']).dt.days / 365.25
+        active_df['Current Class'] = ROOMS.class_names_for_ages(active_df['Age'])
+        active_df['Next Class'] = ROOMS.class_names_for_ages(active_df['Age'] + 1 / 365.25)
+        active_df['Attending'] = active_df.apply(lambda row: is_scheduled_to_attend(row['Time Schedule'], current_date),
+                                                 axis=1)
+
+        for _, row in active_df[active_df['Attending']].iterrows():
+            if row['Current Class'] and row['Current Class'] != 'Graduated':
+                daily_capacities[row['Current Class']] += 1
+                if row['Next Class'] and row['Next Class'] != row['Current Class'] and row['Next Class'] != 'Graduated':
+                    graduations.append((row['First Name'], row['Last Name'], row['Current Class'], row['Next Class']))
+                attendance_log[row['Current Class']].append(f"{row['First Name']} {row['Last Name']}")
+
+        hold_df['Admission Age'] = (current_date - hold_df['Dob']).dt.days / 365.25
+        hold_df['Admission Class'] = ROOMS.class_names_for_ages(hold_df['Admission Age'])
+        new_admissions = hold_df[
+            (hold_df['Admission Date'] <= current_date) & (hold_df['Admission Date'] >= start_date)]
+
+        for _, row in new_admissions.iterrows():
+            if row['Admission Class'] and row['Admission Class'] != 'Graduated':
+                daily_capacities[row['Admission Class']] += 1
+                admissions.append((row['First Name'], row['Last Name'], row['Admission Class']))
+                active_df = pd.concat([active_df, row.to_frame().T], ignore_index=True)
+                hold_df = hold_df.drop(index=row.name)
+
+        results.append({
+            'Date': current_date,
+            'Capacities': daily_capacities,
+            'Graduations': graduations,
+            'Admissions': admissions,
+            'Attendance': {class_name: ", ".join(attendance_log[class_name]) if attendance_log[class_name] else "None"
+                           for class_name in classes.keys()},
+            'FTE': fte.by_class_for_day(current_date.strftime('%A')) if fte is not None else {}
+        })
+        if on_day is not None:
+            on_day(len(results), len(date_range), results[-1])
+
+    return results
@@ -0,0 +1,113 @@
+import csv
+import io
+
+from cube import DAY_NAMES, describe_day
+
+# Export rows are produced lazily from generators. CSV is written in chunks of CHUNK_ROWS rows and
+# XLSX through an openpyxl write-only workbook, so no list of rows or formatted table is built in
+# memory. The finished file is, since download_button needs it as bytes: each export is built only
+# when asked for, and the output page keeps only the latest one.
+
+CHUNK_ROWS = 500
+
+AVAILABILITY_KEYS = ["Availability", "Soonest Available Date", "Schedule Requested"]
+
+TIMELINE_HEADER = ['Date', 'Day', 'Class', 'Children', 'Capacity', 'Seats Free', 'FTE', 'Attendance',
+                   'Graduations', 'Admissions']
+RESULTS_HEADER = ['Section', 'Measure', 'Value']
+
+
+def timeline_rows(timeline, start=None, end=None):
+    # One row per date and class, with the same text as the calendar tooltips
+    for row in timeline.rows(start, end):
+        capacity = timeline.capacity(row['class'])
+        attendance, graduations, admissions = describe_day(row, row['class'], timeline.names)
+        yield [row['date'], DAY_NAMES[row['weekday']], row['class'], row['count'], capacity,
+               max(capacity - row['count'], 0), row['fte'], attendance, graduations, admissions]
+
+
+def results_rows(results):
+    # KPIs and availability from pipeline.check_availability; the per-room tables go in fte_rows
+    for key, value in results.items():
+        if key in ("FTE by Room", "Utilization by Room"):
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(value)
+        yield ["Availability" if key in AVAILABILITY_KEYS else "KPI", key, value]
+
+
+def fte_header(fte_by_room):
+    return ['Room', 'Measure'] + list(fte_by_room.columns)
+
+
+def fte_rows(fte_by_room, utilization_by_room, class_names):
+    for level, room in enumerate(class_names, start=1):
+        yield [room, 'FTE'] + [float(value) for value in fte_by_room.loc[level]]
+        yield [room, 'Utilization'] + [float(value) for value in utilization_by_room.loc[level]]
+
+
+def csv_chunks(header, rows, chunk_rows=CHUNK_ROWS):
+    """Yield CSV text for header and rows, chunk_rows rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_csv(file, header, rows):
+    for chunk in csv_chunks(header, rows):
+        file.write(chunk.encode('utf-8'))
+
+
+def write_xlsx(file, sheets):
+    """Write sheets, a list of (title, header, rows), to file with a write-only workbook."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for title, header, rows in sheets:
+        sheet = workbook.create_sheet(title)
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(file)
+
+
+def _timeline_csv(file, timeline, results):
+    write_csv(file, TIMELINE_HEADER, timeline_rows(timeline))
+
+
+def _results_csv(file, timeline, results):
+    write_csv(file, RESULTS_HEADER, results_rows(results))
+
+
+def _full_report(file, timeline, results):
+    fte_by_room = results["FTE by Room"]
+    write_xlsx(file, [
+        ('Results', RESULTS_HEADER, results_rows(results)),
+        ('FTE by Room', fte_header(fte_by_room),
+         fte_rows(fte_by_room, results["Utilization by Room"], timeline.class_names)),
+        ('Timeline', TIMELINE_HEADER, timeline_rows(timeline)),
+    ])
+
+
+# Label shown on the output page: (file name, MIME type, writer)
+EXPORTS = {
+    "Timeline (CSV)": ("timeline.csv", "text/csv", _timeline_csv),
+    "Results (CSV)": ("results.csv", "text/csv", _results_csv),
+    "Full Report (XLSX)": ("availability_report.xlsx",
+                           "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", _full_report),
+}
+
+
+def build_export(label, timeline, results):
+    """Write one of EXPORTS for the output page and return (file name, MIME type, bytes)."""
+    file_name, mime, write = EXPORTS[label]
+    with io.BytesIO() as file:
+        write(file, timeline, results)
+        return file_name, mime, file.getvalue()
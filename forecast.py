@@ -0,0 +1,148 @@
+import copy
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from engine import Classroom, Student
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+# Optimized admission plans the hold list again in every run. For 300 hold entries that is about
+# 0.5 s per run with the integer solve and 0.2 s on the rounded LP relaxation alone, so those
+# forecasts skip the integer solve and are capped: 100 runs take about 20 s on one core
+OPTIMIZED_PLAN_OPTIONS = {'max_exact_vars': 0}
+OPTIMIZED_MAX_RUNS = 100
+
+_executor = None
+
+
+def _day_number(value):
+    return int(np.datetime64(pd.Timestamp(value).date(), 'D').astype(np.int64))
+
+
+def _perturbed_classroom(base, rng, params):
+    # A fresh Classroom over copies of base's students, so every run starts from the same roster
+    classroom = Classroom(base.capacity_levels, admission_mode=base.admission_mode, plan_options=base.plan_options)
+
+    def maybe_change_days(student):
+        if student.program_type == 'Flexible' and student.schedule and rng.random() < params['flex_change_rate']:
+            days = rng.choice(len(WEEKDAYS), size=min(len(student.schedule), len(WEEKDAYS)), replace=False)
+            student.schedule = [WEEKDAYS[day] for day in sorted(days)]
+        return student
+
+    classroom.students = [maybe_change_days(copy.copy(student)) for student in base.students]
+    for level, queue in base.level_queues.items():
+        for student in queue:
+            if rng.random() < params['dropout_rate']:
+                continue
+            student = copy.copy(student)
+            if rng.random() < params['slip_rate']:
+                student.start_date = student.start_date + timedelta(
+                    days=int(rng.integers(1, params['max_slip_days'] + 1)))
+            classroom.level_queues[level].append(maybe_change_days(student))
+    return classroom
+
+
+def _run_chunk(base, applicant, params, seed, n_runs):
+    """Run n_runs perturbed rosters and return each run's earliest admission day (-1 for none).
+
+    Each run places the applicant with Classroom.apply_for_admission, the same rules as the
+    availability check, so a run with nothing perturbed finds the date shown on the results page.
+    Days are whole days since the epoch; dates past horizon_days after joining count as none.
+    """
+    rng = np.random.default_rng(seed)
+    last_day = applicant['joining_day'] + params['horizon_days']
+    earliest = np.full(n_runs, -1, dtype=np.int64)
+    for run in range(n_runs):
+        classroom = _perturbed_classroom(base, rng, params)
+        student = Student('Applicant', applicant['dob'], applicant['schedule'], None)
+        if student.level is None:
+            continue
+        date = classroom.apply_for_admission(student, applicant['joining_date'])[0]
+        if date is not False and _day_number(date) <= last_day:
+            earliest[run] = _day_number(date)
+    return earliest
+
+
+def _get_executor(workers):
+    global _executor
+    if _executor is None or _executor._max_workers != workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        # spawn keeps the Streamlit server's threads out of the workers
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def forecast_admission(active_df, hold_df, applicant_dob, applicant_schedule, joining_date, capacity_levels,
+                       runs=2000, dropout_rate=0.1, slip_rate=0.3, max_slip_days=30, flex_change_rate=0.1,
+                       horizon_days=365, workers=None, seed=None, admission_mode='greedy'):
+    """Estimate the distribution of the applicant's earliest admission date.
+
+    Every run perturbs the roster independently: each hold-list family drops out with
+    probability dropout_rate, each hold admission slips by 1 to max_slip_days days with
+    probability slip_rate, and each Flexible-program child moves to different weekdays with
+    probability flex_change_rate. Each run then places the applicant with the engine's
+    Classroom under admission_mode, so with every rate at 0 all runs agree with the
+    availability check. Runs are split across a process pool.
+
+    In optimized mode every run plans the hold list again, so runs is capped at
+    OPTIMIZED_MAX_RUNS and plans come from the rounded LP relaxation only. Zero-rate runs then
+    agree with the availability check where its plan did not need the integer solve.
+
+    Returns a dict with the number of runs made, the per-date probabilities, summary percentiles
+    and the share of runs that found no seat within horizon_days.
+    """
+    plan_options = None
+    if admission_mode == 'optimized':
+        runs = min(runs, OPTIMIZED_MAX_RUNS)
+        plan_options = OPTIMIZED_PLAN_OPTIONS
+    base = Classroom(list(capacity_levels), admission_mode=admission_mode, plan_options=plan_options)
+    base.read_existing_data(active_df, hold_df)
+    applicant = {
+        'dob': pd.Timestamp(applicant_dob).date(),
+        'schedule': list(applicant_schedule),
+        'joining_date': pd.Timestamp(joining_date).date(),
+        'joining_day': _day_number(joining_date),
+    }
+    params = {
+        'dropout_rate': dropout_rate,
+        'slip_rate': slip_rate,
+        'max_slip_days': max(int(max_slip_days), 1),
+        'flex_change_rate': flex_change_rate,
+        'horizon_days': horizon_days,
+    }
+
+    workers = workers or os.cpu_count() or 1
+    chunks = [len(chunk) for chunk in np.array_split(np.arange(runs), workers) if len(chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    if len(chunks) == 1:
+        earliest = _run_chunk(base, applicant, params, seeds[0], chunks[0])
+    else:
+        executor = _get_executor(workers)
+        futures = [executor.submit(_run_chunk, base, applicant, params, chunk_seed, n_runs)
+                   for chunk_seed, n_runs in zip(seeds, chunks)]
+        earliest = np.concatenate([future.result() for future in futures])
+
+    found = earliest[earliest >= 0].astype('datetime64[D]')
+    distribution = pd.Series(found).value_counts().sort_index() / runs
+    distribution = pd.DataFrame({'Probability': distribution, 'Cumulative': distribution.cumsum()})
+    distribution.index.name = 'Date'
+
+    def percentile(q):
+        reached = distribution.index[distribution['Cumulative'] >= q]
+        return reached[0].date() if len(reached) else None
+
+    return {
+        'runs': runs,
+        'distribution': distribution,
+        'p10': percentile(0.1),
+        'p50': percentile(0.5),
+        'p90': percentile(0.9),
+        'available_on_joining_date': float((earliest == applicant['joining_day']).mean()),
+        'no_slot_probability': float((earliest < 0).mean()),
+    }
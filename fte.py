@@ -0,0 +1,75 @@
+import io
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from rooms import ROOMS
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+level_dict = {class_name: level for level, class_name in enumerate(ROOMS.names, start=1)}
+
+
+class FteSummary:
+    """An FTE sheet parsed once and rolled up for every room.
+
+    sheet is the parsed sheet with Room mapped to its level, by_room has one row per level with
+    the summed FTE for each weekday present in the sheet plus Total, and utilization is by_room
+    divided by that level's capacity.
+    """
+
+    def __init__(self, sheet, capacity_levels):
+        self.sheet = sheet
+        self.capacity_levels = capacity_levels
+
+        day_columns = [day for day in WEEKDAYS if day in sheet.columns]
+        levels = range(1, len(capacity_levels) + 1)
+        self.by_room = (sheet.groupby('Room')[day_columns + ['Total']].sum()
+                        .reindex(levels, fill_value=0.0))
+        capacities = pd.Series(capacity_levels, index=levels)
+        self.utilization = self.by_room.div(capacities, axis=0)
+
+    def total(self, level):
+        return self.by_room.loc[level, 'Total']
+
+    def for_level(self, level):
+        return self.sheet[self.sheet['Room'] == level]
+
+    def by_class_for_day(self, day_name):
+        # FTE booked in each class on a weekday, for the simulator
+        column = day_name if day_name in self.by_room.columns else None
+        return {class_name: (self.by_room.loc[level, column] if column else 0.0)
+                for class_name, level in level_dict.items()}
+
+
+def read_fte_sheet(content):
+    fte_df = pd.read_excel(io.BytesIO(content), skiprows=2, header=1)
+    fte_df = fte_df.reset_index()
+    fte_df['Room'] = fte_df['Room'].map(level_dict)
+    for day in WEEKDAYS:
+        if day in fte_df.columns:
+            fte_df[day] = pd.to_numeric(fte_df[day], errors='coerce').fillna(0.0)
+    fte_df['Total'] = pd.to_numeric(fte_df['Total'], errors='coerce').fillna(0.0)
+    return fte_df
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_SIZE = 8
+
+
+def get_fte_summary(roster_version, content, capacity_levels):
+    """Return the FteSummary for an upload, parsing the sheet only the first time a roster version is seen."""
+    key = (roster_version, tuple(capacity_levels))
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    summary = FteSummary(read_fte_sheet(content), capacity_levels)
+    with _cache_lock:
+        _cache[key] = summary
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return summary
@@ -0,0 +1,153 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def make_job_key(*parts):
+    """Hash the inputs of a run so identical submissions map to the same job.
+
+    File contents (bytes) are hashed as-is, everything else by its repr.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class Job:
+    def __init__(self, key):
+        self.key = key
+        self.future = None
+        self.cancel_event = threading.Event()
+        self.subscribers = set()
+        self.stage = None
+        self.days_done = 0
+        self.total_days = 0
+        self.partial_results = []
+        self._lock = threading.Lock()
+
+    def on_stage(self, stage):
+        # Runs in the worker thread between pipeline stages, so a cancelled job stops before the next one
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.key)
+        with self._lock:
+            self.stage = stage
+
+    def on_day(self, days_done, total_days, day_result):
+        # Runs in the worker thread once per simulated day
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.key)
+        with self._lock:
+            self.days_done = days_done
+            self.total_days = total_days
+            self.partial_results.append(day_result)
+
+    def progress(self):
+        with self._lock:
+            return self.stage, self.days_done, self.total_days, list(self.partial_results)
+
+    def done(self):
+        return self.future.done()
+
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def result(self):
+        try:
+            return self.future.result()
+        except CancelledError:
+            # Cancelled while still queued, before it ever ran
+            raise JobCancelled(self.key)
+
+
+class JobManager:
+    """Runs availability checks on background threads, one job per distinct set of inputs.
+
+    Submitting inputs that already have a job returns that job instead of starting another,
+    and a session that submits new inputs cancels its previous job unless another session
+    is still waiting on it. Finished jobs are kept for reuse up to max_finished.
+
+    Sessions show they are still waiting through submit, get and touch. A session not seen for
+    stale_after seconds, such as one whose browser was closed mid-run, is released, so its job
+    can be cancelled or evicted.
+    """
+
+    def __init__(self, max_workers=2, max_finished=8, stale_after=30.0):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='availability')
+        self.max_finished = max_finished
+        self.stale_after = stale_after
+        self.jobs = OrderedDict()
+        self.session_jobs = {}
+        self.last_seen = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id, key, fn, *args, **kwargs):
+        with self._lock:
+            self._seen(session_id)
+            previous_key = self.session_jobs.get(session_id)
+            if previous_key is not None and previous_key != key:
+                self._unsubscribe(session_id, previous_key)
+
+            job = self.jobs.get(key)
+            if job is None or job.cancelled() or (job.done() and job.future.exception() is not None):
+                job = Job(key)
+                job.future = self.executor.submit(fn, *args, on_day=job.on_day, on_stage=job.on_stage, **kwargs)
+                self.jobs[key] = job
+            self.jobs.move_to_end(key)
+            job.subscribers.add(session_id)
+            self.session_jobs[session_id] = key
+            self._evict()
+            return job
+
+    def get(self, session_id):
+        with self._lock:
+            self._seen(session_id)
+            key = self.session_jobs.get(session_id)
+            return self.jobs.get(key) if key is not None else None
+
+    def touch(self, session_id):
+        with self._lock:
+            self._seen(session_id)
+
+    def release(self, session_id):
+        with self._lock:
+            self.last_seen.pop(session_id, None)
+            key = self.session_jobs.pop(session_id, None)
+            if key is not None:
+                self._unsubscribe(session_id, key)
+
+    def _seen(self, session_id):
+        now = time.monotonic()
+        self.last_seen[session_id] = now
+        for stale in [other for other, seen in self.last_seen.items() if now - seen > self.stale_after]:
+            del self.last_seen[stale]
+            key = self.session_jobs.pop(stale, None)
+            if key is not None:
+                self._unsubscribe(stale, key)
+        self._evict()
+
+    def _unsubscribe(self, session_id, key):
+        job = self.jobs.get(key)
+        if job is None:
+            return
+        job.subscribers.discard(session_id)
+        if not job.subscribers and not job.done():
+            # A queued job never starts; a running one stops at its next stage or day
+            job.cancel_event.set()
+            job.future.cancel()
+            del self.jobs[key]
+
+    def _evict(self):
+        finished = [key for key, job in self.jobs.items() if job.done() and not job.subscribers]
+        for key in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[key]
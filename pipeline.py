@@ -0,0 +1,109 @@
+import io
+import pandas as pd
+from datetime import datetime
+
+from cube import simulate_occupancy_cube, cube_key, write_cube, content_hash
+from engine import Student, Classroom
+from fte import get_fte_summary
+from jobs import make_job_key
+from rooms import ROOMS
+
+
+def read_roster_file(content):
+    # The roster exports carry three banner rows before the real header row
+    df = pd.read_excel(io.BytesIO(content))
+    df.columns = df.iloc[3]
+    df = df.drop([0, 1, 2, 3]).reset_index(drop=True)
+    return df.dropna(axis=1, how='all')
+
+
+def check_availability(name, dob, schedule, program_type, joining_date, active_bytes, hold_bytes, fte_bytes,
+                       admission_mode='greedy', on_day=None, on_stage=None):
+    """Run the full availability check for one applicant.
+
+    This is everything the submit button used to do inline: parse the uploads, place the
+    applicant, and simulate the next three months into an occupancy cube written to Parquet.
+    Uploads come in as raw bytes so the call can run on a worker thread; on_day is forwarded
+    to the simulator, and on_stage, if given, is called with the name of each stage before it
+    starts and may raise to stop the run there. Returns the dict of values the output page reads
+    from session state.
+    """
+    on_stage = on_stage or (lambda stage: None)
+
+    on_stage("Reading active roster")
+    roster_version = make_job_key(active_bytes, hold_bytes, fte_bytes)
+    active_df = read_roster_file(active_bytes)
+    on_stage("Reading hold roster")
+    hold_df = read_roster_file(hold_bytes)
+
+    active_df['Dob'] = pd.to_datetime(active_df['Dob'], errors='coerce')
+    hold_df['Dob'] = pd.to_datetime(hold_df['Dob'], errors='coerce')
+    hold_df['Admission Date'] = pd.to_datetime(hold_df['Admission Date'], errors='coerce')
+
+    on_stage("Placing applicant")
+    # Initialize classroom with student capacity for each level, from the room model
+    capacity_levels = list(ROOMS.capacity_levels)
+    classroom = Classroom(capacity_levels, admission_mode=admission_mode)
+    classroom.read_existing_data(active_df, hold_df)
+
+    # Create new applicant
+    new_applicant = Student(name, dob, schedule, program_type)
+
+    total_active_students, total_hold_students, graduating_soon, admitted_recent = classroom.kpi_calculate(
+        new_applicant.level)
+    next_available_date, schedule, flexible = classroom.apply_for_admission(new_applicant, joining_date)
+
+    on_stage("Rolling up FTE")
+    # FTE calculation, rolled up for every room once per roster version
+    fte = get_fte_summary(roster_version, fte_bytes, capacity_levels)
+    fte_df = fte.for_level(new_applicant.level)
+    fte_count = fte.total(new_applicant.level)
+
+    if next_available_date is not False:
+        next_available_date = datetime.combine(next_available_date, datetime.min.time())  # Ensure datetime type
+        joining_date = datetime.combine(joining_date, datetime.min.time())  # Ensure datetime type
+        waittime = (next_available_date - joining_date).days
+    else:
+        waittime = 365
+    if next_available_date > joining_date:
+        availability = "No"
+    else:
+        availability = "Yes"
+
+    results = {
+        "Class": new_applicant.get_class_name(),
+        "Total Active Students": sum(total_active_students),
+        "Total Students in Hold": sum(total_hold_students),
+        "Total Capacity of Class": classroom.capacity_levels[new_applicant.level - 1],
+        "Students Graduating Soon": sum(graduating_soon),
+        "Students Admitted Recently": sum(admitted_recent),
+        "FTE": round(fte_count, 2),
+        "FTE by Room": fte.by_room,
+        "Utilization by Room": fte.utilization,
+        "Avg Wait Time in Days": waittime,  # Changed label
+        "Availability": availability,
+        "Soonest Available Date": next_available_date.date(),  # Display only the date
+        "Schedule Requested": schedule
+    }
+
+    # Run the simulation into an occupancy cube on disk, shared by every view of this roster
+    on_stage("Simulating")
+    start_date = datetime.now().strftime('%d-%m-%Y')  # Use the current date as the start date
+    cube, children = simulate_occupancy_cube(start_date, active_df, hold_df, on_day=on_day, fte=fte)
+    on_stage("Writing results")
+    cube_path = write_cube(cube_key(roster_version, start_date), cube, children)
+
+    return {
+        "roster_version": roster_version,
+        "results": results,
+        "applicant_dob": dob,
+        "joining_date": joining_date,
+        "capacity_levels": capacity_levels,
+        "admission_mode": admission_mode,
+        "cube_path": cube_path,
+        "cube_hash": content_hash(cube_path),
+        "start_date": datetime.now(),
+        "active_df": active_df,
+        "hold_df": hold_df,
+        "fte_df": fte_df,
+    }
@@ -0,0 +1,660 @@
+"""Frozen reference engines for differential testing.
+
+A copy of engine.py as it stood before the engine was optimized. Classroom.promote_students and
+admit_students_from_waiting depend on the order students are visited in, and the simulator on the
+order rows are appended, so faster engines are checked against these exact implementations by
+differential.py. Do not change this module to follow engine.py; it is the specification.
+
+The optimized admission mode's planner is frozen here too, from scheduler.py as it stood with the
+fixed four rooms, so the optimized engine is checked against it rather than against itself. Its
+one change since is part of the specification: hold children the plan leaves out fall back to the
+end of their window, and no hold child due by the applicant's date loses a free seat to them.
+"""
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from collections import deque
+from dateutil.relativedelta import relativedelta
+from scipy.optimize import milp, LinearConstraint, Bounds
+from scipy.sparse import coo_matrix
+
+# Define the classes and their age ranges
+classes = {
+    'Infants': (0, 1),
+    'Wobblers': (1, 2),
+    'Older Toddlers': (2, 3),
+    'Preschool': (3, 5)
+}
+
+class Student:
+    def __init__(self, name, date_of_birth, schedule, program_type, start_date=None):
+        self.name = name
+        self.date_of_birth = datetime.combine(date_of_birth, datetime.min.time())  # Convert date to datetime
+        self.level = self.calculate_level_by_dob()
+        self.schedule = schedule
+        self.program_type = program_type
+        self.start_date = start_date
+        self.existing_student = False
+        self.promotion_date = None
+
+    def calculate_level_by_dob(self):
+        age = (datetime.now() - self.date_of_birth).days / 365.25
+        for level, (min_age, max_age) in enumerate(classes.values(), start=1):
+            if min_age <= age < max_age:
+                return level
+        return None  # Return None if age does not fall into any range
+
+    def get_class_name(self):
+        age = (datetime.now() - self.date_of_birth).days / 365.25
+        for class_name, (min_age, max_age) in classes.items():
+            if min_age <= age < max_age:
+                return class_name
+        return "Graduated"  # Indicates the child has graduated out of daycare
+
+    def __str__(self):
+        date_of_birth_str = self.date_of_birth.strftime('%Y-%m-%d')
+        return (f"Student(Name: {self.name}, Date of Birth: {date_of_birth_str}, Level: {self.level}, "
+                f"Schedule: {self.schedule}, Program Type: {self.program_type}, Start Date: {self.start_date}, "
+                f"Class: {self.get_class_name()})")
+
+class Classroom:
+    def __init__(self, capacity_levels, admission_mode='greedy'):
+        # admission_mode 'greedy' admits hold-list children in start date order as seats open,
+        # 'optimized' follows the seat-filling plan from plan_admissions below
+        self.capacity_levels = capacity_levels
+        self.admission_mode = admission_mode
+        self.admission_plans = {}
+        self.level_queues = {1: deque(), 2: deque(), 3: deque(), 4: deque()}
+        self.level_promotedQueues = {1: deque(), 2: deque(), 3: deque(), 4: deque()}
+        self.level_promotedQueues2 = {1: deque(), 2: deque(), 3: deque(), 4: deque()}
+        self.students = []
+        self.graduated_students = []
+
+    def read_existing_data(self, active_df, hold_df):
+        active_df = active_df[['First Name', 'Dob', 'Room', 'Time Schedule', 'Tags', 'Admission Date']]
+        active_df = active_df.rename(
+            columns={'First Name': 'Name', 'Dob': 'DoB', 'Room': 'Room', 'Time Schedule': 'Schedule',
+                     'Tags': 'Program Type', 'Admission Date': 'Start Date'})
+        active_df['Program Type'] = active_df['Program Type'].str.contains('FlexEd').map(
+            {True: 'Flexible', False: 'Fixed'})
+
+        hold_df = hold_df[['First Name', 'Dob', 'Room', 'Time Schedule', 'Tags', 'Admission Date']]
+        hold_df = hold_df.rename(
+            columns={'First Name': 'Name', 'Dob': 'DoB', 'Room': 'Room', 'Time Schedule': 'Schedule',
+                     'Tags': 'Program Type', 'Admission Date': 'Admission Date'})
+        hold_df['Program Type'] = hold_df['Program Type'].str.contains('FlexEd').map({True: 'Flexible', False: 'Fixed'})
+
+        def convert_days(schedule):
+            day_mapping = {
+                'M': 'Monday',
+                'T': 'Tuesday',
+                'W': 'Wednesday',
+                'Th': 'Thursday',
+                'F': 'Friday'}
+
+            days = schedule.split(', ')
+            full_day_names = []
+
+            for day in days:
+                day_abbr = day.split(' ')[0]
+                if day_abbr in day_mapping:
+                    full_day_names.append(day_mapping[day_abbr])
+
+            return ','.join(full_day_names)
+
+        active_df['Schedule'] = active_df['Schedule'].apply(convert_days)
+        active_df['Schedule'] = active_df['Schedule'].apply(lambda x: x.split(','))
+        hold_df['Schedule'] = hold_df['Schedule'].apply(convert_days)
+        hold_df['Schedule'] = hold_df['Schedule'].apply(lambda x: x.split(','))
+
+        for _, row in active_df.iterrows():
+            if pd.notna(row['DoB']):
+                student = Student(row['Name'], datetime.strptime(str(row['DoB']), '%Y-%m-%d %H:%M:%S'),
+                                  row['Schedule'], row['Program Type'],
+                                  datetime.strptime(str(row['Start Date']), '%Y-%m-%d %H:%M:%S'))
+                student.promotion_date = self.calculate_promotion_date(student)
+                student.existing_student = True
+                self.students.append(student)
+
+        for _, row in hold_df.iterrows():
+            if pd.notna(row['DoB']) and pd.notna(row['Admission Date']):
+                student = Student(row['Name'], datetime.strptime(str(row['DoB']), '%Y-%m-%d %H:%M:%S'),
+                                  row['Schedule'], row['Program Type'],
+                                  datetime.strptime(str(row['Admission Date']), '%Y-%m-%d %H:%M:%S'))
+                student.promotion_date = self.calculate_promotion_date(student)
+                self.level_queues[student.level].append(student)
+
+    def calculate_daily_strength(self):
+        daily_strength = {
+            "Monday": {1: 0, 2: 0, 3: 0, 4: 0},
+            "Tuesday": {1: 0, 2: 0, 3: 0, 4: 0},
+            "Wednesday": {1: 0, 2: 0, 3: 0, 4: 0},
+            "Thursday": {1: 0, 2: 0, 3: 0, 4: 0},
+            "Friday": {1: 0, 2: 0, 3: 0, 4: 0}
+        }
+
+        for student in self.students:
+            if student.existing_student and student.schedule is not None:
+                for day in student.schedule:
+                    for level in range(1, 5):
+                        if student.level == level:
+                            daily_strength[day.strip()][level] += 1
+
+        df = pd.DataFrame(daily_strength)
+        return df
+
+    def kpi_calculate(self, level):
+        total_active_students = [0] * 4
+        total_hold_students = [0] * 4
+        graduating_soon = [0] * 4
+        admitted_recent = [0] * 4
+        i = 0
+        j = 0
+        k = 0
+        for student in self.students:
+            if student.level == level:
+                i += 1
+                total_active_students[level - 1] = i
+                if student.promotion_date <= (datetime.now() + timedelta(60)):
+                    j += 1
+                    graduating_soon[level - 1] = j
+                if student.promotion_date >= (datetime.now() + timedelta(300)):
+                    j += 1
+                    graduating_soon[level - 1] = j
+                if student.start_date >= (datetime.now() - timedelta(60)):
+                    k += 1
+                    admitted_recent[level - 1] = k
+        total_hold_students[level - 1] = len(self.level_queues[level])
+
+        return total_active_students, total_hold_students, graduating_soon, admitted_recent
+
+    def apply_for_admission(self, applicant, preferred_joining_date=None):
+        slot_found = False
+        schedule = applicant.schedule
+        if preferred_joining_date is None:
+            preferred_joining_date = datetime.now()
+
+        preferred_joining_date = datetime.combine(preferred_joining_date, datetime.min.time())  # Ensure datetime type
+        self.update_members(preferred_joining_date, None)
+        level = applicant.level
+        self.admit_hold_ahead_of_applicant(level, preferred_joining_date)
+        flexible_students = [student for student in self.students if
+                             student.existing_student and student.level == level and student.program_type == "Flexible"]
+
+        if self.can_join_level(schedule, level):
+            slot_found = True
+            return preferred_joining_date, schedule, False
+        elif flexible_students:
+            slot_found = True
+            return (datetime.now() + timedelta(32)), schedule, True
+        else:
+            next_dates_list = self.calculate_next_possible_dates(level, preferred_joining_date)
+            next_dates_list_sorted = sorted(next_dates_list)
+            prev_date = None
+            for next_date in next_dates_list_sorted:
+                current_age = (next_date - applicant.date_of_birth).days / 365
+                if current_age > self.get_age_limit(applicant.level):
+                    break
+                self.update_members(next_date, None)
+                self.admit_hold_ahead_of_applicant(level, next_date)
+                if self.can_join_level(schedule, level):
+                    slot_found = True
+                    break
+                prev_date = next_date
+            if slot_found:
+                return next_date, schedule, False
+            else:
+                return False, False, False
+
+    def update_members(self, preferred_joining_date, level):
+        if level is None:
+            for level in range(1, 5):
+                self.promote_students(level, preferred_joining_date)
+                self.update_waiting_list(level)
+                self.admit_students_from_waiting(level, preferred_joining_date)
+        else:
+            self.promote_students(level, preferred_joining_date)
+            self.update_waiting_list(level)
+            self.admit_students_from_waiting(level, preferred_joining_date)
+
+    def promote_students(self, level, preferred_joining_date):
+        for student in self.students:
+            if student.existing_student and student.level == level and preferred_joining_date >= student.promotion_date:
+                next_level = student.level + 1
+                schedule = student.schedule
+                if next_level < 4 and self.can_join_level(schedule, next_level):
+                    student.level = next_level
+                    student.promotion_date = self.calculate_promotion_date(student, student.promotion_date)
+                elif next_level < 4:
+                    student.level = next_level
+                    student.start_date = student.promotion_date
+                    student.promotion_date = self.calculate_promotion_date(student, student.promotion_date)
+                    self.level_promotedQueues[student.level].append(student)
+                    self.students.remove(student)
+                elif student.level == 4 and preferred_joining_date >= student.promotion_date:
+                    self.students.remove(student)
+                    self.graduated_students.append(student)
+
+    def update_waiting_list(self, level):
+        if len(self.level_promotedQueues[level]) > 0:
+            self.level_promotedQueues[level] = sorted(self.level_promotedQueues[level], key=lambda x: x.start_date)
+            self.level_promotedQueues[level] = deque(self.level_promotedQueues[level])
+        if len(self.level_queues[level]) > 0:
+            self.level_queues[level] = sorted(self.level_queues[level], key=lambda x: x.start_date)
+            self.level_queues[level] = deque(self.level_queues[level])
+
+    def admit_students_from_waiting(self, level, preferred_joining_date):
+        if self.admission_mode == 'optimized':
+            self.admit_students_by_plan(level, preferred_joining_date)
+            return
+        while ((self.calculate_daily_strength().loc[level] != 0).all()):
+            if len(self.level_promotedQueues[level]) > 0:
+                student = self.level_promotedQueues[level].popleft()
+                schedule = student.schedule
+                if self.can_join_level(schedule, level):
+                    self.students.append(student)
+                else:
+                    self.level_promotedQueues2[level].append(student)
+            elif len(self.level_queues[level]) > 0:
+                student = self.level_queues[level].popleft()
+                schedule = student.schedule
+                if student.start_date <= preferred_joining_date and self.can_join_level(schedule, level):
+                    student.existing_student = True
+                    student.promotion_date = self.calculate_promotion_date(student, student.start_date)
+                    self.students.append(student)
+                else:
+                    self.level_promotedQueues2[level].append(student)
+            else:
+                break
+        self.level_promotedQueues[level].extend(self.level_promotedQueues2[level])
+
+    def admit_students_by_plan(self, level, preferred_joining_date):
+        # Promoted students still take the first free seats
+        waiting_promoted = deque()
+        while len(self.level_promotedQueues[level]) > 0:
+            student = self.level_promotedQueues[level].popleft()
+            if self.can_join_level(student.schedule, level):
+                self.students.append(student)
+            else:
+                waiting_promoted.append(student)
+        self.level_promotedQueues[level] = waiting_promoted
+
+        # The plan is made once per level, the first time the level is filled
+        if level not in self.admission_plans:
+            self.admission_plans[level] = plan_admissions(self, level, preferred_joining_date)
+        plan = self.admission_plans[level]
+
+        waiting_hold = deque()
+        for student in sorted(self.level_queues[level], key=lambda x: plan.get(x, x.start_date)):
+            planned_date = plan.get(student)
+            if planned_date is not None and planned_date <= preferred_joining_date and self.can_join_level(
+                    student.schedule, level):
+                student.existing_student = True
+                student.promotion_date = self.calculate_promotion_date(student, planned_date)
+                self.students.append(student)
+            else:
+                waiting_hold.append(student)
+        self.level_queues[level] = waiting_hold
+
+    def admit_hold_ahead_of_applicant(self, level, date):
+        if self.admission_mode != 'optimized':
+            return
+        for student in list(self.level_queues[level]):
+            if student.start_date <= date < self.calculate_promotion_date(student) and self.can_join_level(
+                    student.schedule, level):
+                student.existing_student = True
+                student.promotion_date = self.calculate_promotion_date(student, date)
+                self.students.append(student)
+                self.level_queues[level].remove(student)
+
+    def can_join_level(self, schedule, level):
+        level_capacity = self.capacity_levels[level - 1]
+        for day in schedule:
+            students_in_level = sum(1 for student in self.students if
+                                    student.level == level and student.schedule and day.lower() in [d.lower() for d in
+                                                                                                    student.schedule])
+            if students_in_level >= level_capacity:
+                return False
+        return True
+
+    def calculate_level(self, dob):
+        age = (datetime.now() - dob).days / 365
+        if 0 <= age < 1:
+            return 1
+        elif 1 <= age < 2:
+            return 2
+        elif 2 <= age < 3:
+            return 3
+        elif 3 <= age <= 5:
+            return 4
+        else:
+            return None
+
+    def calculate_next_possible_dates(self, level, preferred_joining_date):
+        nextPromotedDates = []
+        if level > 2:
+            nextPromotedDates.extend(student.promotion_date for student in self.students if
+                                     student.level == level - 2 and student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+            nextPromotedDates.extend(student.promotion_date for student in self.level_queues[level - 2] if
+                                     student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+        if level > 1:
+            nextPromotedDates.extend(student.promotion_date for student in self.students if
+                                     student.level == level - 1 and student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+            nextPromotedDates.extend(student.promotion_date for student in self.level_queues[level - 1] if
+                                     student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+
+        nextPromotedDates.extend(student.promotion_date for student in self.students if
+                                 student.level == level and student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+        nextPromotedDates.extend(student.promotion_date for student in self.level_queues[level] if
+                                 student.promotion_date >= preferred_joining_date and student.promotion_date is not None)
+        return nextPromotedDates
+
+    def calculate_promotion_date(self, student, inputDate=datetime.now(), promotion_date=None):
+        if promotion_date is None:
+            current_level_age_limit = self.get_age_limit(student.level)
+            next_level_age_limit = self.get_age_limit(student.level + 1) if student.level < 4 else 5
+            current_age = (inputDate - student.date_of_birth).days / 365
+            promotion_date = student.date_of_birth + relativedelta(years=current_level_age_limit)
+        return promotion_date
+
+    def get_age_limit(self, level):
+        if level == 1:
+            return 1
+        elif level == 2:
+            return 2
+        elif level == 3:
+            return 3
+        elif level == 4:
+            return 5
+
+    def printStudent(self, level):
+        for student in self.students:
+            if student.level == level:
+                print(student.name)
+                print(str(student.date_of_birth))
+                print(student.existing_student)
+                print(str(student.promotion_date))
+                print("-------------------******************-------------------")
+
+
+def get_correct_class_by_age(age):
+    if age is None:
+        return None
+    if 0 <= age < 1:
+        return 'Infants'
+    elif 1 <= age < 2:
+        return 'Wobblers'
+    elif 2 <= age < 3:
+        return 'Older Toddlers'
+    elif 3 <= age < 5:
+        return 'Preschool'
+    else:
+        return 'Graduated'  # Indicates the child has graduated out of daycare
+
+
+def is_scheduled_to_attend(schedule, current_date):
+    if pd.isna(schedule):
+        return False
+    day_mapping = {
+        'M': 'Monday',
+        'T': 'Tuesday',
+        'W': 'Wednesday',
+        'Th': 'Thursday',
+        'F': 'Friday',
+        'S': 'Saturday',
+        'Su': 'Sunday'
+    }
+    schedule_days = [day_mapping.get(day.strip(), day) for day in schedule.replace(' (am,pm)', '').split(',')]
+    day_of_week = current_date.strftime('%A')
+    return day_of_week in schedule_days
+
+
+def refined_simulate_three_months_with_graduation_and_schedule(start_date, active_df, hold_df, on_day=None,
+                                                              fte=None):
+    # on_day, if given, is called after each simulated day with (days_done, total_days, day_result)
+    # fte, if given, is an fte.FteSummary whose per-room weekday FTE is attached to each day
+    results = []
+    start_date = pd.to_datetime(start_date, format='%d-%m-%Y')
+    end_date = start_date + pd.DateOffset(months=3)
+    date_range = pd.date_range(start=start_date, end=end_date)
+
+    for current_date in date_range:
+        daily_capacities = {class_name: 0 for class_name in classes.keys()}
+        graduations = []
+        admissions = []
+        attendance_log = {class_name: [] for class_name in classes.keys()}
+
+        # Ensure Dob column is datetime
+        active_df['Dob'] = pd.to_datetime(active_df['Dob'], errors='coerce')
+
+        active_df['Age'] = (current_date - active_df['Dob']).dt.days / 365.25
+        active_df['Current Class'] = active_df['Age'].apply(get_correct_class_by_age)
+        active_df['Next Class'] = active_df['Age'].apply(lambda age: get_correct_class_by_age(age + 1 / 365.25))
+        active_df['Attending'] = active_df.apply(lambda row: is_scheduled_to_attend(row['Time Schedule'], current_date),
+                                                 axis=1)
+
+        for _, row in active_df[active_df['Attending']].iterrows():
+            if row['Current Class'] and row['Current Class'] != 'Graduated':
+                daily_capacities[row['Current Class']] += 1
+                if row['Next Class'] and row['Next Class'] != row['Current Class'] and row['Next Class'] != 'Graduated':
+                    graduations.append((row['First Name'], row['Last Name'], row['Current Class'], row['Next Class']))
+                attendance_log[row['Current Class']].append(f"{row['First Name']} {row['Last Name']}")
+
+        hold_df['Admission Age'] = (current_date - hold_df['Dob']).dt.days / 365.25
+        hold_df['Admission Class'] = hold_df['Admission Age'].apply(get_correct_class_by_age)
+        new_admissions = hold_df[
+            (hold_df['Admission Date'] <= current_date) & (hold_df['Admission Date'] >= start_date)]
+
+        for _, row in new_admissions.iterrows():
+            if row['Admission Class'] and row['Admission Class'] != 'Graduated':
+                daily_capacities[row['Admission Class']] += 1
+                admissions.append((row['First Name'], row['Last Name'], row['Admission Class']))
+                active_df = pd.concat([active_df, row.to_frame().T], ignore_index=True)
+                hold_df = hold_df.drop(index=row.name)
+
+        results.append({
+            'Date': current_date,
+            'Capacities': daily_capacities,
+            'Graduations': graduations,
+            'Admissions': admissions,
+            'Attendance': {class_name: ", ".join(attendance_log[class_name]) if attendance_log[class_name] else "None"
+                           for class_name in classes.keys()},
+            'FTE': fte.by_class_for_day(current_date.strftime('%A')) if fte is not None else {}
+        })
+        if on_day is not None:
+            on_day(len(results), len(date_range), results[-1])
+
+    return results
+
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+
+# Stands in for "always" on the open start of a stay in a level
+_FAR_PAST = datetime(1900, 1, 1)
+
+
+def _attends(schedule):
+    days = [day.strip().lower() for day in schedule or []]
+    return np.array([day in days for day in WEEKDAYS], dtype=bool)
+
+
+def _stay_in_level(classroom, student, level):
+    # [enter, leave) for the time a child spends in level, based on age alone
+    enter = _FAR_PAST if level == 1 else student.date_of_birth + relativedelta(
+        years=classroom.get_age_limit(level - 1))
+    leave = student.date_of_birth + relativedelta(years=classroom.get_age_limit(level))
+    return enter, leave
+
+
+def plan_admissions(classroom, level, from_date, horizon_weeks=52, max_delay_weeks=12, max_overtakes=10,
+                    priority_weight=0.5, time_limit=5.0, max_exact_vars=400):
+    """Choose which hold-list children to admit to a level, and in which week, to fill the most seat-days.
+
+    Time is split into weeks starting on the Monday of from_date's week. A child is counted in a
+    week if their stay in the level overlaps it, so seats are never double booked within a week.
+    Children already in the level, those promoted into it later, and those in the promoted queue
+    hold their seats first; hold-list children are only placed in what is left under
+    capacity_levels. Each hold child can be admitted at most once, in their requested week or up
+    to max_delay_weeks later.
+
+    Priority follows queue order by start date. Earlier children get a bonus of up to
+    priority_weight seat-days, so ties go to them. With max_overtakes set, a child who is left
+    waiting can be passed by at most that many later children.
+
+    Problems with up to max_exact_vars (child, week) pairs are solved exactly with HiGHS through
+    scipy's milp. Larger ones solve the LP relaxation and round it greedily, which keeps hundreds
+    of hold entries well under a second.
+
+    Returns a dict mapping every hold-list Student to the date from which they may be admitted;
+    children the plan does not place fall back to the week after their last candidate week. If the
+    solver finds no solution, every child is planned on their own start date, which matches the
+    greedy admission rule.
+    """
+    queue = sorted(classroom.level_queues[level], key=lambda x: x.start_date)
+    if not queue:
+        return {}
+
+    capacity = classroom.capacity_levels[level - 1]
+    week_start = from_date - timedelta(days=from_date.weekday())
+    week_start = datetime.combine(week_start, datetime.min.time())
+    starts = np.array([week_start + timedelta(weeks=k) for k in range(horizon_weeks)], dtype='datetime64[D]')
+    ends = starts + np.timedelta64(7, 'D')
+
+    # Seats already taken in each week and weekday, as (student, is in the promoted queue) pairs
+    occupants = [(student, False) for student in classroom.students
+                 if student.existing_student and student.level is not None and student.level <= level]
+    occupants += [(student, True) for student in classroom.level_promotedQueues[level]]
+    base = np.zeros((horizon_weeks, len(WEEKDAYS)), dtype=np.int64)
+    if occupants:
+        enter = []
+        leave = []
+        for student, promoted in occupants:
+            student_enter, student_leave = _stay_in_level(classroom, student, level)
+            if student.level == level:
+                student_enter = student.start_date if promoted else _FAR_PAST
+            enter.append(student_enter)
+            leave.append(student_leave)
+        enter = np.array(enter, dtype='datetime64[D]')
+        leave = np.array(leave, dtype='datetime64[D]')
+        present = (enter[None, :] < ends[:, None]) & (leave[None, :] > starts[:, None])
+        attends = np.array([_attends(student.schedule) for student, _ in occupants])
+        base = present.astype(np.int64) @ attends.astype(np.int64)
+    free = np.maximum(capacity - base, 0)
+
+    queue_attends = np.array([_attends(student.schedule) for student in queue])
+    queue_first = np.searchsorted(ends, np.array([student.start_date for student in queue], dtype='datetime64[D]'),
+                                  side='right')
+    queue_leave = np.searchsorted(starts, np.array([_stay_in_level(classroom, student, level)[1] for student in queue],
+                                                   dtype='datetime64[D]'), side='left')
+    plan = {student: max(student.start_date, week_start + timedelta(weeks=int(first) + max_delay_weeks + 1))
+            for student, first in zip(queue, queue_first)}
+
+    # Waiting past the requested week only helps in a week where a seat frees up, either because
+    # an occupant moves on or because another hold child would leave the level
+    frees_seat = np.zeros_like(free, dtype=bool)
+    frees_seat[1:] = free[1:] > free[:-1]
+    leaving = queue_leave < horizon_weeks
+    frees_seat[queue_leave[leaving]] |= queue_attends[leaving]
+
+    # One binary variable per (child, candidate week)
+    var_child = []
+    var_week = []
+    var_value = []
+    cap_rows = []
+    cap_cols = []
+    n = len(queue)
+    for rank in range(n):
+        days = np.flatnonzero(queue_attends[rank])
+        first = int(queue_first[rank])
+        last_stay = min(int(queue_leave[rank]), horizon_weeks)
+        candidates = [week for week in range(first, min(first + max_delay_weeks + 1, last_stay))
+                      if week == first or frees_seat[week, days].any()]
+        for week in candidates:
+            var = len(var_child)
+            rows = (np.arange(week, last_stay)[:, None] * len(WEEKDAYS) + days[None, :]).ravel()
+            cap_rows.append(rows)
+            cap_cols.append(np.full(len(rows), var))
+            var_child.append(rank)
+            var_week.append(week)
+            var_value.append(len(rows) + priority_weight * (n - rank) / n)
+
+    if not var_child:
+        return plan
+
+    var_child = np.array(var_child)
+    var_value = np.array(var_value)
+    n_vars = len(var_child)
+    constraints = [
+        LinearConstraint(coo_matrix((np.ones(sum(len(r) for r in cap_rows)),
+                                     (np.concatenate(cap_rows), np.concatenate(cap_cols))),
+                                    shape=(horizon_weeks * len(WEEKDAYS), n_vars)).tocsr(), ub=free.ravel()),
+        LinearConstraint(coo_matrix((np.ones(n_vars), (var_child, np.arange(n_vars))), shape=(n, n_vars)).tocsr(),
+                         ub=np.ones(n)),
+    ]
+    if max_overtakes is not None:
+        # For every child i: (admitted children queued after i) - n * (i admitted) <= max_overtakes
+        rows = []
+        cols = []
+        values = []
+        for i in range(n):
+            later = np.flatnonzero(var_child > i)
+            own = np.flatnonzero(var_child == i)
+            rows.append(np.full(len(later) + len(own), i))
+            cols.append(np.concatenate([later, own]))
+            values.append(np.concatenate([np.ones(len(later)), np.full(len(own), -float(n))]))
+        constraints.append(LinearConstraint(
+            coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                       shape=(n, n_vars)).tocsr(), ub=np.full(n, float(max_overtakes))))
+
+    exact = n_vars <= max_exact_vars
+    result = milp(-var_value, constraints=constraints, integrality=np.ones(n_vars) if exact else np.zeros(n_vars),
+                  bounds=Bounds(0, 1), options={'time_limit': time_limit})
+    if result.x is None:
+        return {student: student.start_date for student in queue}
+
+    if exact:
+        chosen = np.flatnonzero(result.x > 0.5)
+    else:
+        chosen = _round(result.x, var_value, var_child, cap_rows, free.ravel(), n, max_overtakes)
+
+    for var in chosen:
+        student = queue[var_child[var]]
+        week_date = starts[var_week[var]].astype(datetime)
+        plan[student] = max(student.start_date, datetime.combine(week_date, datetime.min.time()))
+    return plan
+
+
+def _round(x, var_value, var_child, cap_rows, free, n, max_overtakes):
+    # Take variables in order of their LP value while they still fit, one week per child
+    order = np.lexsort((-var_value, -x))
+    used = np.zeros_like(free)
+    chosen = {}
+
+    def place(child, candidates):
+        for var in candidates:
+            rows = cap_rows[var]
+            if (used[rows] < free[rows]).all():
+                used[rows] += 1
+                chosen[child] = var
+                return True
+        return False
+
+    for var in order:
+        if var_child[var] not in chosen:
+            place(var_child[var], [var])
+
+    if max_overtakes is not None:
+        # A waiting child passed too often gets a seat if one is free, otherwise the last
+        # admitted child gives theirs up
+        while True:
+            placed = np.zeros(n, dtype=bool)
+            placed[list(chosen)] = True
+            passed = np.cumsum(placed[::-1])[::-1] - placed
+            waiting = np.flatnonzero(~placed & (passed > max_overtakes))
+            if not len(waiting):
+                break
+            child = waiting[0]
+            if not place(child, [var for var in order if var_child[var] == child]):
+                last = max(chosen)
+                used[cap_rows[chosen.pop(last)]] -= 1
+    return sorted(chosen.values())
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import toml
+from dateutil.relativedelta import relativedelta
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.toml')
+
+
+class RoomModel:
+    """The rooms children move through, in age order, with their age bands and capacities.
+
+    Level n is the nth room. A room holds children from its min_age up to, but not including, its
+    max_age, and the bands are contiguous, so they compile into one sorted array of boundaries:
+    every room's min_age followed by the last room's max_age. Classifying ages is one searchsorted
+    over that array, whether for a single child or a whole DOB column.
+    """
+
+    def __init__(self, rooms):
+        if not rooms:
+            raise ValueError("At least one room must be configured")
+        for room in rooms:
+            if not room['min_age'] < room['max_age']:
+                raise ValueError(f"Room {room['name']} must have min_age below max_age")
+        for room, next_room in zip(rooms, rooms[1:]):
+            if room['max_age'] != next_room['min_age']:
+                raise ValueError(f"Room {next_room['name']} must start at {room['name']}'s max_age")
+
+        self.names = [room['name'] for room in rooms]
+        self.capacity_levels = [int(room['capacity']) for room in rooms]
+        self.classes = {room['name']: (room['min_age'], room['max_age']) for room in rooms}
+        self.age_edges = np.array([room['min_age'] for room in rooms] + [rooms[-1]['max_age']], dtype=float)
+        self._names_by_level = np.array(['Graduated'] + self.names + ['Graduated'], dtype=object)
+
+    def __len__(self):
+        return len(self.names)
+
+    def levels(self, ages):
+        # Level of each age; 0 below the first band, len(self) + 1 from the last max_age or for NaN
+        return np.searchsorted(self.age_edges, ages, side='right')
+
+    def level_for_age(self, age):
+        """Level (1 based) for an age in years, or None if it is outside every room."""
+        level = int(self.levels(age))
+        return level if 1 <= level <= len(self) else None
+
+    def class_names_for_ages(self, ages):
+        """Room name for each age in years, 'Graduated' for ages outside every room or missing."""
+        return self._names_by_level[self.levels(np.asarray(ages, dtype=float))]
+
+    def class_for_age(self, age):
+        if age is None:
+            return None
+        return self._names_by_level[self.levels(float(age))]
+
+    def age_limit(self, level):
+        """Age in years at which children leave level, or None for a level outside the model."""
+        if level is None or not 1 <= level <= len(self):
+            return None
+        return self.classes[self.names[level - 1]][1]
+
+
+def age_offset(years):
+    # Whole months, so bands such as 18 months work with date arithmetic
+    return relativedelta(months=round(years * 12))
+
+
+def load_room_model(path=CONFIG_PATH):
+    return RoomModel(toml.load(path)['rooms'])
+
+
+# Loaded once per process, at first import
+ROOMS = load_room_model()
@@ -0,0 +1,203 @@
+import numpy as np
+from datetime import datetime, timedelta
+from scipy.optimize import milp, LinearConstraint, Bounds
+from scipy.sparse import coo_matrix
+
+from rooms import age_offset
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
+
+# Stands in for "always" on the open start of a stay in a level
+_FAR_PAST = datetime(1900, 1, 1)
+
+
+def _attends(schedule):
+    days = [day.strip().lower() for day in schedule or []]
+    return np.array([day in days for day in WEEKDAYS], dtype=bool)
+
+
+def _stay_in_level(classroom, student, level):
+    # [enter, leave) for the time a child spends in level, based on age alone
+    enter = _FAR_PAST if level == 1 else student.date_of_birth + age_offset(classroom.get_age_limit(level - 1))
+    leave = student.date_of_birth + age_offset(classroom.get_age_limit(level))
+    return enter, leave
+
+
+def plan_admissions(classroom, level, from_date, horizon_weeks=52, max_delay_weeks=12, max_overtakes=10,
+                    priority_weight=0.5, time_limit=0.25, max_exact_vars=400):
+    """Choose which hold-list children to admit to a level, and in which week, to fill the most seat-days.
+
+    Time is split into weeks starting on the Monday of from_date's week. A child is counted in a
+    week if their stay in the level overlaps it, so seats are never double booked within a week.
+    Children already in the level, those promoted into it later, and those in the promoted queue
+    hold their seats first; hold-list children are only placed in what is left under
+    capacity_levels. Each hold child can be admitted at most once, in their requested week or up
+    to max_delay_weeks later.
+
+    Priority follows queue order by start date. Earlier children get a bonus of up to
+    priority_weight seat-days, so ties go to them. With max_overtakes set, a child who is left
+    waiting can be passed by at most that many later children.
+
+    The LP relaxation is always solved, through scipy's milp with HiGHS, and rounded greedily. Problems
+    with up to max_exact_vars (child, week) pairs are then also solved as integer programs for at
+    most time_limit seconds, and the better of the two plans is kept. With rooms that are mostly
+    free the integer program rarely proves optimal quickly, so the time limit, not the problem
+    size, bounds a level's planning time: about time_limit plus 0.05 s for 300 hold entries.
+
+    Returns a dict mapping every hold-list Student to the date from which they may be admitted. A
+    child the plan does not place is not dropped: they fall back to the week after their last
+    candidate week, from which they take the first seat that frees up, as in greedy mode, and so
+    still come before any applicant. If the solver finds no solution, every child is planned on
+    their own start date, which matches the greedy admission rule.
+    """
+    queue = sorted(classroom.level_queues[level], key=lambda x: x.start_date)
+    if not queue:
+        return {}
+
+    capacity = classroom.capacity_levels[level - 1]
+    week_start = from_date - timedelta(days=from_date.weekday())
+    week_start = datetime.combine(week_start, datetime.min.time())
+    starts = np.array([week_start + timedelta(weeks=k) for k in range(horizon_weeks)], dtype='datetime64[D]')
+    ends = starts + np.timedelta64(7, 'D')
+
+    # Seats already taken in each week and weekday, as (student, is in the promoted queue) pairs
+    occupants = [(student, False) for student in classroom.students
+                 if student.existing_student and student.level is not None and student.level <= level]
+    occupants += [(student, True) for student in classroom.level_promotedQueues[level]]
+    base = np.zeros((horizon_weeks, len(WEEKDAYS)), dtype=np.int64)
+    if occupants:
+        enter = []
+        leave = []
+        for student, promoted in occupants:
+            student_enter, student_leave = _stay_in_level(classroom, student, level)
+            if student.level == level:
+                student_enter = student.start_date if promoted else _FAR_PAST
+            enter.append(student_enter)
+            leave.append(student_leave)
+        enter = np.array(enter, dtype='datetime64[D]')
+        leave = np.array(leave, dtype='datetime64[D]')
+        present = (enter[None, :] < ends[:, None]) & (leave[None, :] > starts[:, None])
+        attends = np.array([_attends(student.schedule) for student, _ in occupants])
+        base = present.astype(np.int64) @ attends.astype(np.int64)
+    free = np.maximum(capacity - base, 0)
+
+    queue_attends = np.array([_attends(student.schedule) for student in queue])
+    queue_first = np.searchsorted(ends, np.array([student.start_date for student in queue], dtype='datetime64[D]'),
+                                  side='right')
+    queue_leave = np.searchsorted(starts, np.array([_stay_in_level(classroom, student, level)[1] for student in queue],
+                                                   dtype='datetime64[D]'), side='left')
+    plan = {student: max(student.start_date, week_start + timedelta(weeks=int(first) + max_delay_weeks + 1))
+            for student, first in zip(queue, queue_first)}
+
+    # Waiting past the requested week only helps in a week where a seat frees up, either because
+    # an occupant moves on or because another hold child would leave the level
+    frees_seat = np.zeros_like(free, dtype=bool)
+    frees_seat[1:] = free[1:] > free[:-1]
+    leaving = queue_leave < horizon_weeks
+    frees_seat[queue_leave[leaving]] |= queue_attends[leaving]
+
+    # One binary variable per (child, candidate week)
+    var_child = []
+    var_week = []
+    var_value = []
+    cap_rows = []
+    cap_cols = []
+    n = len(queue)
+    for rank in range(n):
+        days = np.flatnonzero(queue_attends[rank])
+        first = int(queue_first[rank])
+        last_stay = min(int(queue_leave[rank]), horizon_weeks)
+        candidates = [week for week in range(first, min(first + max_delay_weeks + 1, last_stay))
+                      if week == first or frees_seat[week, days].any()]
+        for week in candidates:
+            var = len(var_child)
+            rows = (np.arange(week, last_stay)[:, None] * len(WEEKDAYS) + days[None, :]).ravel()
+            cap_rows.append(rows)
+            cap_cols.append(np.full(len(rows), var))
+            var_child.append(rank)
+            var_week.append(week)
+            var_value.append(len(rows) + priority_weight * (n - rank) / n)
+
+    if not var_child:
+        return plan
+
+    var_child = np.array(var_child)
+    var_value = np.array(var_value)
+    n_vars = len(var_child)
+    constraints = [
+        LinearConstraint(coo_matrix((np.ones(sum(len(r) for r in cap_rows)),
+                                     (np.concatenate(cap_rows), np.concatenate(cap_cols))),
+                                    shape=(horizon_weeks * len(WEEKDAYS), n_vars)).tocsr(), ub=free.ravel()),
+        LinearConstraint(coo_matrix((np.ones(n_vars), (var_child, np.arange(n_vars))), shape=(n, n_vars)).tocsr(),
+                         ub=np.ones(n)),
+    ]
+    if max_overtakes is not None:
+        # For every child i: (admitted children queued after i) - n * (i admitted) <= max_overtakes
+        rows = []
+        cols = []
+        values = []
+        for i in range(n):
+            later = np.flatnonzero(var_child > i)
+            own = np.flatnonzero(var_child == i)
+            rows.append(np.full(len(later) + len(own), i))
+            cols.append(np.concatenate([later, own]))
+            values.append(np.concatenate([np.ones(len(later)), np.full(len(own), -float(n))]))
+        constraints.append(LinearConstraint(
+            coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                       shape=(n, n_vars)).tocsr(), ub=np.full(n, float(max_overtakes))))
+
+    relaxed = milp(-var_value, constraints=constraints, integrality=np.zeros(n_vars), bounds=Bounds(0, 1))
+    if relaxed.x is None:
+        return {student: student.start_date for student in queue}
+    chosen = _round(relaxed.x, var_value, var_child, cap_rows, free.ravel(), n, max_overtakes)
+
+    if n_vars <= max_exact_vars:
+        # The best integer solution found within time_limit, unless the rounded one is better
+        result = milp(-var_value, constraints=constraints, integrality=np.ones(n_vars), bounds=Bounds(0, 1),
+                      options={'time_limit': time_limit})
+        if result.x is not None:
+            exact = np.flatnonzero(result.x > 0.5)
+            if var_value[exact].sum() >= var_value[chosen].sum():
+                chosen = exact
+
+    for var in chosen:
+        student = queue[var_child[var]]
+        week_date = starts[var_week[var]].astype(datetime)
+        plan[student] = max(student.start_date, datetime.combine(week_date, datetime.min.time()))
+    return plan
+
+
+def _round(x, var_value, var_child, cap_rows, free, n, max_overtakes):
+    # Take variables in order of their LP value while they still fit, one week per child
+    order = np.lexsort((-var_value, -x))
+    used = np.zeros_like(free)
+    chosen = {}
+
+    def place(child, candidates):
+        for var in candidates:
+            rows = cap_rows[var]
+            if (used[rows] < free[rows]).all():
+                used[rows] += 1
+                chosen[child] = var
+                return True
+        return False
+
+    for var in order:
+        if var_child[var] not in chosen:
+            place(var_child[var], [var])
+
+    if max_overtakes is not None:
+        # A waiting child passed too often gets a seat if one is free, otherwise the last
+        # admitted child gives theirs up
+        while True:
+            placed = np.zeros(n, dtype=bool)
+            placed[list(chosen)] = True
+            passed = np.cumsum(placed[::-1])[::-1] - placed
+            waiting = np.flatnonzero(~placed & (passed > max_overtakes))
+            if not len(waiting):
+                break
+            child = waiting[0]
+            if not place(child, [var for var in order if var_child[var] == child]):
+                last = max(chosen)
+                used[cap_rows[chosen.pop(last)]] -= 1
+    return sorted(chosen.values())
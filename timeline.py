@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+from cube import DAY_NAMES, read_cube, child_names
+from engine import classes
+
+EVENT_COLUMNS = ['graduating_out', 'graduating_in', 'admitted']
+
+
+def _day(value):
+    return pd.Timestamp(value).to_datetime64().astype('datetime64[D]')
+
+
+class Timeline:
+    """An occupancy cube indexed by date, for range queries without scanning every day.
+
+    Rows are sorted by date and class, so a date range is found with a binary search over the
+    sorted datetime64 index and only the k rows inside it are touched. counts holds one row per
+    date and one column per class. The child_id lists of the cube stay as Arrow offsets and
+    values, so one day's row or a range of events is sliced out without converting the rest.
+    """
+
+    def __init__(self, cube, children, capacity_levels):
+        self.class_names = list(classes)
+        self.capacity_levels = list(capacity_levels)
+        self.names = child_names(children)
+
+        class_index = np.array([self.class_names.index(name) for name in cube['class'].cast('string').to_pylist()],
+                               dtype=np.int64)
+        row_dates = cube['date'].to_numpy()
+        order = np.lexsort((class_index, row_dates))
+        cube = cube.take(order)
+        self._row_dates = row_dates[order]
+        self._row_class = class_index[order]
+
+        self.dates = np.unique(self._row_dates)
+        self.weekdays = (self.dates.view(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+        date_index = np.searchsorted(self.dates, self._row_dates)
+        self.counts = np.zeros((len(self.dates), len(self.class_names)), dtype=np.int64)
+        self.counts[date_index, self._row_class] = cube['count'].to_numpy()
+        self._rows = np.full(self.counts.shape, -1, dtype=np.int64)
+        self._rows[date_index, self._row_class] = np.arange(len(cube))
+        self._weekday = cube['weekday'].to_numpy()
+        self._fte = cube['fte'].to_numpy()
+
+        self._lists = {}
+        for column in ['attending'] + EVENT_COLUMNS:
+            array = cube[column].combine_chunks()
+            self._lists[column] = (array.offsets.to_numpy(), array.values.to_numpy())
+
+        # For each class and weekday, the index of the first open date on that weekday at or
+        # after every position, so the earliest open date is a lookup instead of a scan
+        n = len(self.dates)
+        capacity = np.array(self.capacity_levels, dtype=np.int64)
+        is_open = self.counts < capacity[None, :]
+        self._next_open = np.full((len(self.class_names), len(DAY_NAMES), n + 1), n, dtype=np.int64)
+        for weekday in range(len(DAY_NAMES)):
+            on_weekday = self.weekdays == weekday
+            for index in range(len(self.class_names)):
+                candidates = np.where(on_weekday & is_open[:, index], np.arange(n), n)
+                self._next_open[index, weekday, :n] = np.minimum.accumulate(candidates[::-1])[::-1]
+
+    def _range(self, start, end):
+        lo = 0 if start is None else np.searchsorted(self.dates, _day(start), side='left')
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, _day(end), side='right')
+        return lo, hi
+
+    def capacity(self, class_name):
+        return self.capacity_levels[self.class_names.index(class_name)]
+
+    def occupancy(self, class_name, start=None, end=None):
+        """Children in class_name on each date from start to end inclusive, as a Series indexed by date."""
+        lo, hi = self._range(start, end)
+        return pd.Series(self.counts[lo:hi, self.class_names.index(class_name)],
+                         index=pd.DatetimeIndex(self.dates[lo:hi]), name=class_name)
+
+    def first_date_below_capacity(self, class_name, weekdays, start=None):
+        """The first date on or after start, on one of weekdays, when class_name has a free seat.
+
+        weekdays are day names such as 'Monday'. Returns a date, or None if no such date is simulated.
+        """
+        lo, _ = self._range(start, None)
+        index = self.class_names.index(class_name)
+        found = min((self._next_open[index, DAY_NAMES.index(day.capitalize()), lo] for day in weekdays),
+                    default=len(self.dates))
+        return self.dates[found].astype(object) if found < len(self.dates) else None
+
+    def _row(self, position, index):
+        row = self._rows[position, index]
+        if row < 0:
+            return None
+        result = {'date': self.dates[position].astype(object), 'weekday': int(self._weekday[row]),
+                  'class': self.class_names[index], 'count': int(self.counts[position, index]),
+                  'fte': None if np.isnan(self._fte[row]) else float(self._fte[row])}
+        for column, (offsets, values) in self._lists.items():
+            result[column] = values[offsets[row]:offsets[row + 1]].tolist()
+        return result
+
+    def day(self, class_name, date):
+        """One class's cube row for a date as a dict with child_id lists, or None if it is not simulated."""
+        position = np.searchsorted(self.dates, _day(date))
+        if position == len(self.dates) or self.dates[position] != _day(date):
+            return None
+        return self._row(position, self.class_names.index(class_name))
+
+    def rows(self, start=None, end=None):
+        """Yield each class's row, as returned by day, for every date from start to end inclusive."""
+        lo, hi = self._range(start, end)
+        for position in range(lo, hi):
+            for index in range(len(self.class_names)):
+                row = self._row(position, index)
+                if row is not None:
+                    yield row
+
+    def events_between(self, start=None, end=None):
+        """Graduations and admissions from start to end inclusive, one row per child and event.
+
+        Returns a DataFrame with Date, Class, Event, Child ID and Child columns, ordered by date
+        and class.
+        """
+        lo = 0 if start is None else np.searchsorted(self._row_dates, _day(start), side='left')
+        hi = len(self._row_dates) if end is None else np.searchsorted(self._row_dates, _day(end), side='right')
+        frames = []
+        for order, column in enumerate(EVENT_COLUMNS):
+            offsets, values = self._lists[column]
+            owners = np.repeat(np.arange(lo, hi), np.diff(offsets[lo:hi + 1]))
+            frames.append(pd.DataFrame({
+                'row': owners,
+                'order': order,
+                'Date': self._row_dates[owners],
+                'Class': [self.class_names[i] for i in self._row_class[owners]],
+                'Event': column,
+                'Child ID': values[offsets[lo]:offsets[hi]],
+            }))
+        events = pd.concat(frames, ignore_index=True).sort_values(['row', 'order'], kind='stable')
+        events['Child'] = [self.names[i] for i in events['Child ID']]
+        return events.drop(columns=['row', 'order']).reset_index(drop=True)
+
+
+def load_timeline(cube_path, capacity_levels):
+    """Read a cube written by cube.write_cube into a Timeline."""
+    cube, children = read_cube(cube_path)
+    return Timeline(cube, children, capacity_levels)
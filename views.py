@@ -0,0 +1,198 @@
+import functools
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+
+from dateutil.relativedelta import relativedelta
+
+# HTML building blocks for the Streamlit pages. This module is imported once per server process,
+# so main.py only has to call into it on each rerun. Anything needing pandas or pyarrow imports it
+# inside the function, keeping those libraries off the input page's cold start.
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+STYLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'style.css')
+
+
+@lru_cache(maxsize=None)
+def page_style():
+    # Streamlit needs the stylesheet on every run, so read and minify it only once
+    with open(STYLE_PATH) as f:
+        css = f.read()
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    return f"<style>{css}</style>"
+
+
+def metric_box(label, value, color='green'):
+    return f"""
+    <div class='metric-box centered'>
+        <h4>{label}</h4>
+        <p style="color: {color};">{value}</p>
+    </div>
+    """
+
+
+def cached_by_hash(maxsize):
+    """Cache fn(cube_path, cube_hash, *args) on cube_hash and args, least recently used first out.
+
+    Cubes with the same content hash hold the same data wherever they were written, so cube_path is
+    left out of the key and only read on a miss. The other arguments must be hashable.
+    """
+    def decorator(fn):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(cube_path, cube_hash, *args):
+            key = (cube_hash,) + args
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    return cache[key]
+            value = fn(cube_path, cube_hash, *args)
+            with lock:
+                cache[key] = value
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return value
+        return wrapper
+    return decorator
+
+
+@cached_by_hash(maxsize=16)
+def load_timeline(cube_path, cube_hash, capacity_levels):
+    """Index an occupancy cube by date, once per cube content and capacities across reruns and sessions.
+
+    capacity_levels must be a tuple so it can be part of the cache key.
+    """
+    import timeline
+
+    return timeline.load_timeline(cube_path, capacity_levels)
+
+
+def fte_table(fte_by_room, utilization_by_room):
+    from engine import classes
+
+    fte_columns = list(fte_by_room.columns)
+    fte_rows = []
+    for level, room in enumerate(classes, start=1):
+        cells = "".join(f"<td>{fte_by_room.loc[level, column]:.2f}<br>{utilization_by_room.loc[level, column]:.0%}</td>"
+                        for column in fte_columns)
+        fte_rows.append(f'<tr><th class="table-header">{room}</th>{cells}</tr>')
+    fte_header = "".join(f'<th class="table-header">{column}</th>' for column in fte_columns)
+    return f"""
+    <h3 class='centered'>FTE and Utilization by Room</h3>
+    <table class='horizontal-table centered'>
+        <thead><tr><th class="table-header">Room</th>{fte_header}</tr></thead>
+        <tbody>{"".join(fte_rows)}</tbody>
+    </table>
+    """
+
+
+def schedule_table(timeline, class_name):
+    from cube import DAY_NAMES, describe_day
+
+    # Generate the schedule table for the first Monday to Friday
+    max_capacity = timeline.capacity(class_name)
+    schedule_table_data = {DAY_NAMES[row['weekday']]: row for row in
+                           (timeline.day(class_name, date) for date in timeline.dates[:7]) if row['weekday'] < 5}
+
+    table_data = {day: [] for day in WEEKDAYS}
+    for day in WEEKDAYS:
+        if day in schedule_table_data:
+            day_data = schedule_table_data[day]
+            capacity = day_data['count']
+            attendance, graduations, admissions = describe_day(day_data, class_name, timeline.names)
+            color = 'red' if capacity == max_capacity else 'green'
+
+            table_data[day].append(f'<div class="tooltip" style="color: {color};"><b>{capacity}</b><span class="tooltiptext">Attendance: {attendance}<br>Graduations: {graduations}<br>Admissions: {admissions}</span></div>')
+        else:
+            table_data[day].append('')
+
+    # Generate table with inline styles for headers
+    return f"""
+    <h3 class='centered'>Schedule Availability</h3>
+    <table class='horizontal-table centered'>
+        <thead>
+            <tr>
+                <th class="table-header">Day</th>
+                {" ".join([f'<th class="table-header">{day}</th>' for day in WEEKDAYS])}
+            </tr>
+        </thead>
+        <tbody>
+            <tr>
+                <th class="table-header">Kids in Class</th>
+                {" ".join([f'<td>{table_data[day][0]}</td>' for day in WEEKDAYS])}
+            </tr>
+        </tbody>
+    </table>
+    """
+
+
+def calendar_month(month_start, start_date, timeline, class_name):
+    from cube import describe_day
+
+    month_end = month_start + relativedelta(day=31)
+    days_of_week = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    parts = [f"<div><h3 class='centered'>{month_start.strftime('%B %Y')}</h3><div class='calendar-header centered'>"]
+    parts.extend(f"<div class='calendar-day'>{day[:3]}</div>" for day in days_of_week)
+    parts.append("</div><div class='calendar centered'>")
+
+    first_day_of_month = month_start.replace(day=1).weekday()
+    parts.extend("<div class='calendar-day no-data'></div>" for _ in range(first_day_of_month))
+
+    day = month_start.replace(day=1)
+    while day <= month_end:
+        if day.weekday() == 0 and day.day != 1:
+            parts.append("</div><div class='calendar centered'>")
+        color_class = ""
+        tooltip_text = ""
+        if day < start_date or day.weekday() >= 5:
+            color_class = "no-data"
+        else:
+            sim_result = timeline.day(class_name, day)
+            if sim_result is not None:
+                capacity = sim_result['count']
+                attendance, graduations, admissions = describe_day(sim_result, class_name, timeline.names)
+                color_class = "green" if capacity < timeline.capacity(class_name) else "red"
+                tooltip_text = f"Capacity: {capacity}<br>Attendance: {attendance}<br>Graduations: {graduations}<br>Admissions: {admissions}"
+
+        parts.append(f"<div class='calendar-day {color_class}'><div class='tooltip'>{day.day}<span class='tooltiptext'>{tooltip_text}</span></div></div>")
+        day += timedelta(days=1)
+
+    parts.append("</div></div>")
+    return "".join(parts)
+
+
+def generate_calendar(start_date, timeline, class_name, months=3):
+    # Generate the 3-month calendar view; start_date is a date, so days compare by day only
+    return "".join(calendar_month(start_date + relativedelta(months=i), start_date, timeline, class_name)
+                   for i in range(months))
+
+
+# Rendered HTML keyed by the cube's content hash and the view parameters. The same cube, class
+# and capacities always produce the same markup, so revisiting the output page, another session
+# looking at the same roster, or redrawing one month reuses the string instead of rebuilding
+# thousands of tooltip cells.
+
+@cached_by_hash(maxsize=64)
+def render_schedule_table(cube_path, cube_hash, class_name, capacity_levels):
+    return schedule_table(load_timeline(cube_path, cube_hash, capacity_levels), class_name)
+
+
+@cached_by_hash(maxsize=256)
+def render_calendar_month(cube_path, cube_hash, class_name, capacity_levels, start_date, month_start):
+    return calendar_month(month_start, start_date, load_timeline(cube_path, cube_hash, capacity_levels), class_name)
+
+
+def render_calendar(cube_path, cube_hash, class_name, capacity_levels, start_date, months=3):
+    """The calendar from start_date, a datetime or date; only its day goes into the cache key."""
+    if hasattr(start_date, 'date'):
+        start_date = start_date.date()
+    return "".join(render_calendar_month(cube_path, cube_hash, class_name, capacity_levels, start_date,
+                                         start_date + relativedelta(months=i)) for i in range(months))